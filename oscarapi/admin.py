@@ -4,3 +4,4 @@ from oscarapi import models
 
 # Register your models here.
 admin.site.register(models.ApiKey)
+admin.site.register(models.ProductTombstone)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OscarAPIConfig(AppConfig):
     name = "oscarapi"
     default_auto_field = "django.db.models.AutoField"
+
+    def ready(self):
+        from oscarapi import receivers  # noqa pylint: disable=unused-import
@@ -0,0 +1,53 @@
+"""
+Invalidation of what is cached about baskets when they change.
+
+The receivers in :mod:`oscarapi.receivers` call these for the signals of the
+basket models. Code that changes baskets without sending those signals, eg.
+with ``QuerySet.update``, should call them as well.
+"""
+
+from django.db import transaction
+
+from oscarapi.basket.shipping import (
+    get_shipping_quote_cache,
+    invalidate_shipping_quotes,
+)
+from oscarapi.basket.summary import (
+    get_basket_summary_cache,
+    invalidate_all_basket_summaries,
+    invalidate_basket_summary,
+)
+from oscarapi.basket.versioning import (
+    bump_all_basket_versions,
+    bump_basket_version,
+    get_basket_version_cache,
+)
+
+__all__ = ("baskets_changed", "all_baskets_changed")
+
+
+def baskets_changed(basket_ids):
+    "Invalidate the summaries and bump the versions of the baskets on commit"
+    if get_basket_summary_cache() is not None:
+        for basket_id in basket_ids:
+            transaction.on_commit(
+                lambda basket_id=basket_id: invalidate_basket_summary(basket_id)
+            )
+    if get_basket_version_cache() is not None:
+        for basket_id in basket_ids:
+            transaction.on_commit(
+                lambda basket_id=basket_id: bump_basket_version(basket_id)
+            )
+
+
+def all_baskets_changed():
+    """
+    Invalidate the summaries, versions and shipping quotes of all baskets on
+    commit, eg. because the prices changed.
+    """
+    if get_basket_summary_cache() is not None:
+        transaction.on_commit(invalidate_all_basket_summaries)
+    if get_basket_version_cache() is not None:
+        transaction.on_commit(bump_all_basket_versions)
+    if get_shipping_quote_cache() is not None:
+        transaction.on_commit(invalidate_shipping_quotes)
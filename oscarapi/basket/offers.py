@@ -0,0 +1,144 @@
+"""
+A cache for the results of applying offers to a basket.
+
+The results are cached under a fingerprint of everything the offers of a
+basket depend on: its lines, their prices and quantities, its vouchers, the
+user and the groups of the user, and a version of the offers which changes
+whenever an offer, condition, benefit, range or voucher changes. When the
+fingerprint of a basket matches, the offer applications and the discounts of
+its lines are restored without evaluating any condition.
+
+Applicators that make use of the request, eg. for session offers, can not be
+cached and the cache should be left disabled for them.
+"""
+
+import copy
+import hashlib
+
+from django.core.cache import caches
+
+from oscar.core.loading import get_class
+
+from oscarapi import settings
+from oscarapi.utils.cache import bump_version, get_version
+
+__all__ = (
+    "get_offer_cache",
+    "invalidate_offer_applications",
+    "get_offer_cache_key",
+    "get_line_fingerprints",
+    "restore_offer_applications",
+    "store_offer_applications",
+)
+
+OfferApplications = get_class("offer.results", "OfferApplications")
+
+OFFER_VERSION_KEY = "oscarapi:offers:version"
+
+
+def get_offer_cache():
+    "Return the cache configured with ``OSCARAPI_OFFER_CACHE`` or None"
+    if settings.OFFER_CACHE is None:
+        return None
+    return caches[settings.OFFER_CACHE]
+
+
+def invalidate_offer_applications():
+    "Invalidate all cached offer applications at once"
+    cache = get_offer_cache()
+    if cache is not None:
+        bump_version(cache, OFFER_VERSION_KEY)
+
+
+def _get_line_price(line):
+    price = line.purchase_info.price
+    return (
+        str(price.excl_tax),
+        str(price.incl_tax) if price.is_tax_known else None,
+    )
+
+
+def get_line_fingerprints(basket):
+    "Return what the lines of ``basket`` are, for use in a cache key"
+    return [
+        (
+            line.pk,
+            line.line_reference,
+            line.product_id,
+            line.stockrecord_id,
+            line.quantity,
+            _get_line_price(line),
+        )
+        for line in basket.all_lines()
+    ]
+
+
+def get_offer_cache_key(basket, user):
+    """
+    Compute the key under which the offer applications of ``basket`` are
+    cached, or None when the cache is disabled.
+    """
+    cache = get_offer_cache()
+    if cache is None:
+        return None
+
+    lines = get_line_fingerprints(basket)
+    vouchers = sorted(basket.vouchers.values_list("pk", flat=True))
+    if user.is_authenticated:
+        groups = sorted(user.groups.values_list("pk", flat=True))
+    else:
+        groups = []
+
+    fingerprint = repr(
+        (
+            get_version(cache, OFFER_VERSION_KEY),
+            basket.pk,
+            user.pk,
+            lines,
+            vouchers,
+            groups,
+        )
+    )
+    return "oscarapi:offers:%s" % hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def store_offer_applications(basket, key):
+    "Cache the offer applications and line discounts of ``basket`` under ``key``"
+    if key is None:
+        return
+
+    discounts = {}
+    for line in basket.all_lines():
+        # the registry refers to its line, which is attached again on restore
+        registry = copy.copy(line.discounts)
+        registry._line = None  # pylint: disable=protected-access
+        discounts[line.pk] = registry
+
+    get_offer_cache().set(
+        key,
+        (basket.offer_applications.applications, discounts),
+        timeout=settings.OFFER_CACHE_TIMEOUT,
+    )
+
+
+def restore_offer_applications(basket, key):
+    """
+    Restore the offer applications and line discounts of ``basket`` cached
+    under ``key``. Returns False if they are not cached.
+    """
+    if key is None:
+        return False
+
+    cached = get_offer_cache().get(key)
+    if cached is None:
+        return False
+
+    applications, discounts = cached
+    for line in basket.all_lines():
+        registry = discounts[line.pk]
+        registry._line = line  # pylint: disable=protected-access
+        line.discounts = registry
+
+    basket.offer_applications = OfferApplications()
+    basket.offer_applications.applications = applications
+    return True
@@ -1,15 +1,25 @@
 "This module contains operation on baskets and lines"
 
-from django.conf import settings
+from django.conf import settings as django_settings
 
 from oscar.core.loading import get_class, get_model
 from oscar.core.utils import get_default_currency
 
+from oscarapi import settings
+from oscarapi.basket.offers import (
+    get_offer_cache_key,
+    restore_offer_applications,
+    store_offer_applications,
+)
+
 __all__ = (
     "apply_offers",
     "assign_basket_strategy",
+    "get_prepared_basket",
+    "invalidate_prepared_basket",
     "prepare_basket",
     "get_basket",
+    "save_basket",
     "get_basket_id_from_session",
     "get_anonymous_basket",
     "get_user_basket",
@@ -26,14 +36,33 @@ Applicator = get_class("offer.applicator", "Applicator")
 Selector = get_class("partner.strategy", "Selector")
 
 
+def _prepared_baskets(request):
+    # kept on the django request, so it is shared with the middleware
+    request = getattr(request, "_request", request)
+    prepared = getattr(request, "_oscarapi_prepared_baskets", None)
+    if prepared is None:
+        prepared = request._oscarapi_prepared_baskets = {}
+    return prepared
+
+
 def apply_offers(request, basket):
     "Apply offers and discounts to cart"
     basket.reset_offer_applications()
     if not basket.is_empty:
-        Applicator().apply(basket, request.user, request)
+        key = get_offer_cache_key(basket, request.user)
+        if not restore_offer_applications(basket, key):
+            Applicator().apply(basket, request.user, request)
+            store_offer_applications(basket, key)
+
+    # the offers of this basket are up to date for the rest of the request
+    if basket.pk is not None:
+        _prepared_baskets(request)[basket.pk] = basket
 
 
 def assign_basket_strategy(basket, request):
+    if _prepared_baskets(request).get(basket.pk) is basket:
+        return basket
+
     if hasattr(request, "strategy"):
         basket.strategy = request.strategy
     else:  # in management commands, the request might not be available.
@@ -44,26 +73,60 @@ def assign_basket_strategy(basket, request):
     return basket
 
 
+def get_prepared_basket(basket, request):
+    """
+    Return the basket with the same id as ``basket`` that already got its
+    strategy and offers during this request, so the offers are applied only
+    once per request, or prepare ``basket`` if there is none.
+    """
+    prepared = _prepared_baskets(request).get(basket.pk)
+    if prepared is not None:
+        return prepared
+    return assign_basket_strategy(basket, request)
+
+
+def invalidate_prepared_basket(basket, request):
+    "Apply the offers again the next time ``basket`` is prepared"
+    _prepared_baskets(request).pop(basket.pk, None)
+
+
 def prepare_basket(basket, request):
-    assign_basket_strategy(basket, request)
+    basket = get_prepared_basket(basket, request)
     store_basket_in_session(basket, request.session)
     return basket
 
 
 def get_basket(request, prepare=True):
-    "Get basket from the request."
+    """
+    Get basket from the request.
+
+    With ``OSCARAPI_LAZY_ANONYMOUS_BASKETS`` an anonymous user without a
+    basket gets an empty basket that is not saved until
+    :func:`save_basket` is called, eg. when a product is added.
+    """
     if request.user.is_authenticated:
         basket = get_user_basket(request.user)
     else:
         basket = get_anonymous_basket(request)
         if basket is None:
-            basket = Basket.objects.create()
-            basket.save()
+            if settings.LAZY_ANONYMOUS_BASKETS:
+                basket = Basket()
+            else:
+                basket = Basket.objects.create()
+                basket.save()
     return prepare_basket(basket, request) if prepare else basket
 
 
+def save_basket(basket, request):
+    "Save a lazy anonymous basket and store it in the session"
+    if basket.pk is None:
+        basket.save()
+        store_basket_in_session(basket, request.session)
+    return basket
+
+
 def get_basket_id_from_session(request):
-    return request.session.get(settings.OSCAR_BASKET_COOKIE_OPEN)
+    return request.session.get(django_settings.OSCAR_BASKET_COOKIE_OPEN)
 
 
 def editable_baskets():
@@ -98,8 +161,15 @@ def get_user_basket(user):
 
 
 def store_basket_in_session(basket, session):
-    session[settings.OSCAR_BASKET_COOKIE_OPEN] = basket.pk
-    session.save()
+    """
+    Store the id of ``basket`` in the session. The session is only modified
+    when the id changed, and saved by the session middleware along with any
+    other changes when the response is sent.
+    """
+    if basket.pk is None:  # lazy baskets are stored once they are saved
+        return
+    if session.get(django_settings.OSCAR_BASKET_COOKIE_OPEN) != basket.pk:
+        session[django_settings.OSCAR_BASKET_COOKIE_OPEN] = basket.pk
 
 
 def request_allows_access_to_basket(request, basket):
@@ -0,0 +1,163 @@
+"""
+A cache for shipping quotes: the shipping methods available for a basket,
+with their charges and discounts calculated.
+
+A shipping repository that asks a rates service for its charges can take a
+while, so the quotes made when the shipping methods of a basket are requested
+are reused when the basket is checked out, as long as the basket, the shipping
+address and the user stay the same. All quotes are invalidated when the
+offers or the prices change. Within a request the quotes are made only once,
+even without a cache.
+
+A quote is passed to ``place_order`` in place of the shipping method, so an
+order only gets what a quote has: the code, name, description, charge and
+discount of the method. Other attributes of a custom method are only
+available as ``quote.method``, and only in the request that made the quote.
+"""
+
+import hashlib
+
+from django.core.cache import caches
+
+from oscar.core.loading import get_class, get_model
+
+from oscarapi import settings
+from oscarapi.basket.offers import get_line_fingerprints
+from oscarapi.utils.cache import bump_version, get_version
+
+__all__ = (
+    "ShippingQuote",
+    "get_shipping_quote_cache",
+    "get_shipping_quotes",
+    "get_default_shipping_quote",
+    "invalidate_shipping_quotes",
+)
+
+Repository = get_class("shipping.repository", "Repository")
+ShippingAddress = get_model("order", "ShippingAddress")
+
+SHIPPING_VERSION_KEY = "oscarapi:shipping:version"
+
+
+class ShippingQuote(object):
+    """
+    A shipping method with its charge and discount calculated for a basket.
+    It can be used in place of the method and it can be cached, without the
+    method itself.
+    """
+
+    def __init__(self, method, basket):
+        self.method = method
+        self.code = method.code
+        self.name = method.name
+        self.description = method.description
+        self.is_discounted = method.is_discounted
+        self.charge = method.calculate(basket)
+        self.discount_amount = method.discount(basket)
+
+    def calculate(self, basket):  # pylint: disable=unused-argument
+        return self.charge
+
+    def discount(self, basket):  # pylint: disable=unused-argument
+        return self.discount_amount
+
+    def __getstate__(self):
+        # methods might not be picklable and might hold a client of a service
+        state = self.__dict__.copy()
+        state["method"] = None
+        return state
+
+
+def get_shipping_quote_cache():
+    "Return the cache configured with ``OSCARAPI_SHIPPING_QUOTE_CACHE`` or None"
+    if settings.SHIPPING_QUOTE_CACHE is None:
+        return None
+    return caches[settings.SHIPPING_QUOTE_CACHE]
+
+
+def invalidate_shipping_quotes():
+    "Invalidate all cached shipping quotes at once"
+    cache = get_shipping_quote_cache()
+    if cache is not None:
+        bump_version(cache, SHIPPING_VERSION_KEY)
+
+
+def _get_address_fingerprint(shipping_address):
+    if shipping_address is None:
+        return None
+    # the checkout passes the validated data of the address
+    if isinstance(shipping_address, dict):
+        shipping_address = ShippingAddress(**shipping_address)
+    return shipping_address.get_address_field_values(shipping_address.hash_fields)
+
+
+def _get_shipping_quote_key(basket, user, shipping_address, version):
+    fingerprint = repr(
+        (
+            version,
+            basket.pk,
+            user.pk,
+            get_line_fingerprints(basket),
+            [discount["offer"].pk for discount in basket.shipping_discounts],
+            str(basket.total_excl_tax),
+            str(basket.total_incl_tax) if basket.is_tax_known else None,
+            _get_address_fingerprint(shipping_address),
+        )
+    )
+    return "oscarapi:shipping:%s" % hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def _quoted_shipping(request):
+    # pylint: disable=protected-access
+    request = getattr(request, "_request", request)
+    if not hasattr(request, "_oscarapi_shipping_quotes"):
+        request._oscarapi_shipping_quotes = {}
+    return request._oscarapi_shipping_quotes
+
+
+def get_shipping_quotes(basket, request, shipping_address=None):
+    """
+    Return the quotes of the shipping methods available for ``basket``,
+    which should have its offers applied.
+    """
+    cache = get_shipping_quote_cache()
+    version = None if cache is None else get_version(cache, SHIPPING_VERSION_KEY)
+    key = _get_shipping_quote_key(basket, request.user, shipping_address, version)
+
+    quoted = _quoted_shipping(request)
+    if key in quoted:
+        return quoted[key]
+
+    quotes = None if cache is None else cache.get(key)
+    if quotes is None:
+        methods = Repository().get_shipping_methods(
+            basket=basket,
+            user=request.user,
+            shipping_addr=shipping_address,
+            request=request,
+        )
+        quotes = [ShippingQuote(method, basket) for method in methods]
+        if cache is not None:
+            cache.set(key, quotes, timeout=settings.SHIPPING_QUOTE_CACHE_TIMEOUT)
+
+    quoted[key] = quotes
+    return quotes
+
+
+def get_default_shipping_quote(basket, request, shipping_address=None):
+    """
+    Return the quote of the default shipping method of the ``Repository``.
+    The repository decides which method is the default, the charges are
+    taken from the quotes.
+    """
+    method = Repository().get_default_shipping_method(
+        basket=basket,
+        user=request.user,
+        shipping_addr=shipping_address,
+        request=request,
+    )
+    quotes = get_shipping_quotes(basket, request, shipping_address)
+    quote = next((quote for quote in quotes if quote.code == method.code), None)
+    if quote is None:
+        return ShippingQuote(method, basket)
+    return quote
@@ -0,0 +1,83 @@
+"""
+A cache for the summary of a basket: the number of lines and items, the
+total and the currency.
+
+The summary of a basket is removed from the cache whenever one of its lines
+or vouchers changes, and all summaries are invalidated at once when offers or
+stockrecords change, because those change the totals of any basket.
+"""
+
+from django.core.cache import caches
+
+from oscar.core.utils import get_default_currency
+
+from oscarapi import settings
+from oscarapi.basket import operations
+from oscarapi.utils.cache import bump_version, get_version
+
+__all__ = (
+    "get_basket_summary_cache",
+    "get_basket_summary",
+    "invalidate_basket_summary",
+    "invalidate_all_basket_summaries",
+)
+
+SUMMARY_VERSION_KEY = "oscarapi:basket-summary:version"
+
+
+def get_basket_summary_cache():
+    "Return the cache configured with ``OSCARAPI_BASKET_SUMMARY_CACHE`` or None"
+    if settings.BASKET_SUMMARY_CACHE is None:
+        return None
+    return caches[settings.BASKET_SUMMARY_CACHE]
+
+
+def _summary_key(basket_id):
+    return "oscarapi:basket-summary:%s" % basket_id
+
+
+def compute_basket_summary(basket, request):
+    basket = operations.get_prepared_basket(basket, request)
+    return {
+        "num_lines": basket.num_lines,
+        "num_items": basket.num_items,
+        "total_incl_tax": (
+            basket.total_incl_tax if basket.is_tax_known else basket.total_excl_tax
+        ),
+        "currency": basket.currency or get_default_currency(),
+    }
+
+
+def get_basket_summary(basket, request):
+    """
+    Return the summary of ``basket``, from the cache if possible, so the
+    offers don't have to be applied.
+    """
+    cache = get_basket_summary_cache()
+    if cache is None or basket.pk is None:
+        return compute_basket_summary(basket, request)
+
+    version = get_version(cache, SUMMARY_VERSION_KEY)
+    cached = cache.get(_summary_key(basket.pk))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    summary = compute_basket_summary(basket, request)
+    cache.set(
+        _summary_key(basket.pk),
+        (version, summary),
+        timeout=settings.BASKET_SUMMARY_CACHE_TIMEOUT,
+    )
+    return summary
+
+
+def invalidate_basket_summary(basket_id):
+    cache = get_basket_summary_cache()
+    if cache is not None and basket_id is not None:
+        cache.delete(_summary_key(basket_id))
+
+
+def invalidate_all_basket_summaries():
+    cache = get_basket_summary_cache()
+    if cache is not None:
+        bump_version(cache, SUMMARY_VERSION_KEY)
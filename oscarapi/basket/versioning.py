@@ -0,0 +1,86 @@
+"""
+Versions of baskets, for ETags and optimistic concurrency.
+
+Every basket has a version that is incremented whenever one of its lines or
+vouchers or its status changes, and all baskets share a global version that
+changes with the offers and prices. A version that is evicted from the cache
+starts again at the current time, so versions only ever increase.
+
+The versions are only consistent when every process uses the same cache, so
+the cache should be memcached, redis or the database, and never a
+``LocMemCache``, which is local to a process.
+"""
+
+from django.core.cache import caches
+
+from oscarapi import settings
+from oscarapi.utils.cache import bump_version, get_versions
+
+__all__ = (
+    "get_basket_version_cache",
+    "get_basket_version",
+    "claim_basket_version",
+    "bump_basket_version",
+    "bump_all_basket_versions",
+)
+
+GLOBAL_VERSION_KEY = "oscarapi:basket-version"
+# a claim only has to outlive the request that makes it
+CLAIM_TIMEOUT = 60
+
+
+def get_basket_version_cache():
+    "Return the cache configured with ``OSCARAPI_BASKET_VERSION_CACHE`` or None"
+    if settings.BASKET_VERSION_CACHE is None:
+        return None
+    return caches[settings.BASKET_VERSION_CACHE]
+
+
+def _version_key(basket_id):
+    return "%s:%s" % (GLOBAL_VERSION_KEY, basket_id)
+
+
+def get_basket_version(basket_id):
+    """
+    Return the version of the basket with ``basket_id`` and the global
+    version, or None when the cache is disabled.
+    """
+    cache = get_basket_version_cache()
+    if cache is None or basket_id is None:
+        return None
+
+    keys = [_version_key(basket_id), GLOBAL_VERSION_KEY]
+    versions = get_versions(cache, keys)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def claim_basket_version(basket_id, version):
+    """
+    Increment the version of the basket with ``basket_id`` if it is still
+    ``version``. Because adding a key is atomic, only one of the requests
+    that read the same version can claim it, the others don't change the
+    version. Returns False when another request changed the basket first.
+    """
+    cache = get_basket_version_cache()
+    key = _version_key(basket_id)
+    if not cache.add("%s:%s" % (key, version), True, timeout=CLAIM_TIMEOUT):
+        return False
+    try:
+        return cache.incr(key) == version + 1
+    except ValueError:  # evicted
+        return False
+
+
+def bump_basket_version(basket_id):
+    cache = get_basket_version_cache()
+    if cache is not None and basket_id is not None:
+        try:
+            cache.incr(_version_key(basket_id))
+        except ValueError:
+            pass  # evicted, the next version starts at the current time
+
+
+def bump_all_basket_versions():
+    cache = get_basket_version_cache()
+    if cache is not None:
+        bump_version(cache, GLOBAL_VERSION_KEY)
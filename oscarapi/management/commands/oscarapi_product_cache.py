@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from oscarapi.utils.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hits and misses of the serialized product cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        self.stdout.write("hits: %(hits)s\nmisses: %(misses)s" % stats)
+        if total:
+            self.stdout.write("hit ratio: %.1f%%" % (100.0 * stats["hits"] / total))
+
+        if options["reset"]:
+            reset_cache_stats()
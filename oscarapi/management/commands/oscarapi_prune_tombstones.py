@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from oscarapi import settings
+from oscarapi.models import ProductTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the tombstones of products that were deleted longer ago than "
+        "OSCARAPI_PRODUCT_TOMBSTONE_RETENTION_DAYS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.PRODUCT_TOMBSTONE_RETENTION_DAYS,
+            help="The number of days to keep the tombstones",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            self.stdout.write("tombstones are kept forever")
+            return
+        if days < 0:
+            raise CommandError("--days should not be negative")
+
+        until = timezone.now() - timedelta(days=days)
+        deleted, _ = ProductTombstone.objects.filter(date_deleted__lt=until).delete()
+        self.stdout.write("deleted %s tombstones" % deleted)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from oscarapi.utils.session import get_session_engine, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired header sessions in batches, so the sessions table is "
+        "never locked for long"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of sessions to delete at once",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="The number of seconds to wait between batches",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Delete expired cookie sessions as well",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size should be at least 1")
+        if not hasattr(get_session_engine().SessionStore, "get_model_class"):
+            raise CommandError(
+                "The session engine does not store sessions in the database, "
+                "use clearsessions instead"
+            )
+
+        deleted = purge_expired_sessions(
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            header_sessions_only=not options["all"],
+        )
+        self.stdout.write("deleted %s expired sessions" % deleted)
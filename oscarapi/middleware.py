@@ -1,7 +1,7 @@
 import logging
 import re
 
-from django.conf import settings
+from django.conf import settings as django_settings
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core.exceptions import PermissionDenied
 from django.http.response import HttpResponse
@@ -14,11 +14,13 @@ from rest_framework import exceptions
 from rest_framework import authentication
 
 from oscarapi.basket.operations import (
+    get_basket_id_from_session,
     request_allows_access_to_basket,
     store_basket_in_session,
-    get_basket,
 )
 
+from oscarapi import settings
+from oscarapi.utils.apikey import api_key_cache, hash_api_key
 from oscarapi.utils.loading import get_api_class
 from oscarapi.utils.request import get_domain
 from oscarapi.utils.session import session_id_from_parsed_session_uri, get_session
@@ -47,7 +49,11 @@ def parse_session_id(request):
 
 def start_or_resume(session_id, session_type):
     if session_type == "ANON":
-        return get_session(session_id, raise_on_create=False)
+        return get_session(
+            session_id,
+            raise_on_create=False,
+            defer_create=settings.LAZY_HEADER_SESSIONS,
+        )
 
     return get_session(session_id, raise_on_create=True)
 
@@ -127,11 +133,20 @@ class ApiGatewayMiddleWare(IsApiRequest):
     def __init__(self, get_response):
         self.get_response = get_response
 
+    def is_valid_key(self, key):
+        "Check if ``key`` is one of the api keys, cached for a while"
+        is_valid = api_key_cache.get(key)
+        if is_valid is None:
+            stored_key = hash_api_key(key) if settings.HASH_API_KEYS else key
+            is_valid = models.ApiKey.objects.filter(key=stored_key).exists()
+            api_key_cache.set(key, is_valid)
+        return is_valid
+
     def __call__(self, request):
         if self.is_api_request(request):
             key = authentication.get_authorization_header(request)
             key = key.decode(HTTP_HEADER_ENCODING)
-            if not models.ApiKey.objects.filter(key=key).exists():
+            if not self.is_valid_key(key):
                 logger.error(
                     "Invalid credentials provided for %s:%s by %s",
                     request.method,
@@ -183,28 +198,29 @@ class ApiBasketMiddleWare(BasketMiddleware, IsApiRequest):
             and hasattr(request, "user")
             and request.session
         ):
-            # at this point we are sure a basket can be found in the session
-            # (if the session hasn't been destroyed by logging out),
-            # because it is enforced in process_request.
-            # We just have to make sure it is stored as a cookie, because it
-            # could have been created by oscarapi.
+            # Any basket that was used during the request has been stored in
+            # the session by now (unless the session has been destroyed by
+            # logging out). We just have to make sure it is stored as a
+            # cookie, because it could have been created by oscarapi. The id
+            # is all that is needed for that, so the basket is not looked up
+            # and requests that never used a basket don't get one.
             cookie_key = self.get_cookie_key(request)
-            basket = get_basket(request, prepare=False)
-            cookie = self.get_basket_hash(basket.id)
 
             # Delete any surplus cookies
             cookies_to_delete = getattr(request, "cookies_to_delete", [])
-            for cookie_key in cookies_to_delete:
-                response.delete_cookie(cookie_key)
+            for key in cookies_to_delete:
+                response.delete_cookie(key)
 
             if not request.user.is_authenticated:
-                response.set_cookie(
-                    cookie_key,
-                    cookie,
-                    max_age=settings.OSCAR_BASKET_COOKIE_LIFETIME,
-                    secure=settings.OSCAR_BASKET_COOKIE_SECURE,
-                    httponly=True,
-                )
+                basket_id = get_basket_id_from_session(request)
+                if basket_id is not None:
+                    response.set_cookie(
+                        cookie_key,
+                        self.get_basket_hash(basket_id),
+                        max_age=django_settings.OSCAR_BASKET_COOKIE_LIFETIME,
+                        secure=django_settings.OSCAR_BASKET_COOKIE_SECURE,
+                        httponly=True,
+                    )
             return response
         else:
             return super(ApiBasketMiddleWare, self).process_response(request, response)
@@ -0,0 +1,24 @@
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oscarapi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('product_id', models.IntegerField(db_index=True)),
+                ('upc', models.CharField(max_length=64, blank=True, null=True)),
+                ('date_deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ('date_deleted', 'id'),
+            },
+            bases=(models.Model,),
+        ),
+    ]
@@ -2,7 +2,42 @@ from django.db import models
 
 
 class ApiKey(models.Model):
+    """
+    A key that gives access to the api, see
+    :class:`oscarapi.middleware.ApiGatewayMiddleWare`. With
+    ``OSCARAPI_HASH_API_KEYS`` only a hash of the key is stored.
+    """
+
     key = models.CharField(max_length=255, unique=True)
 
     class Meta:
         app_label = "oscarapi"
+
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        # oscarapi.settings can not be imported before the models are loaded
+        # pylint: disable=import-outside-toplevel
+        from oscarapi import settings
+        from oscarapi.utils.apikey import hash_api_key, is_hashed_api_key
+
+        # a key that was hashed before is saved as it is
+        if settings.HASH_API_KEYS and not is_hashed_api_key(self.key):
+            self.key = hash_api_key(self.key)
+        super(ApiKey, self).save(*args, **kwargs)
+
+
+class ProductTombstone(models.Model):
+    """
+    Records the deletion of a product, so the product change feed can
+    report it.
+    """
+
+    product_id = models.IntegerField(db_index=True)
+    upc = models.CharField(max_length=64, blank=True, null=True)
+    date_deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = "oscarapi"
+        ordering = ("date_deleted", "id")
+
+    def __str__(self):
+        return "Deleted product #%s" % self.product_id
@@ -0,0 +1,269 @@
+# pylint: disable=unused-argument
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+from oscar.apps.basket import signals as basket_signals
+from oscar.core.loading import get_model
+
+from oscarapi import settings
+from oscarapi.basket.invalidation import all_baskets_changed, baskets_changed
+from oscarapi.basket.offers import get_offer_cache, invalidate_offer_applications
+from oscarapi.models import ApiKey, ProductTombstone
+from oscarapi.utils.apikey import api_key_cache
+from oscarapi.utils.cache import (
+    bump_model_versions,
+    get_catalogue_version_cache,
+    get_representation_cache,
+    invalidate_all_representations,
+    invalidate_representations,
+)
+
+Product = get_model("catalogue", "Product")
+ProductAttributeValue = get_model("catalogue", "ProductAttributeValue")
+ProductImage = get_model("catalogue", "ProductImage")
+ProductCategory = get_model("catalogue", "ProductCategory")
+ProductRecommendation = get_model("catalogue", "ProductRecommendation")
+ProductClass = get_model("catalogue", "ProductClass")
+ProductAttribute = get_model("catalogue", "ProductAttribute")
+Category = get_model("catalogue", "Category")
+Option = get_model("catalogue", "Option")
+AttributeOption = get_model("catalogue", "AttributeOption")
+StockRecord = get_model("partner", "StockRecord")
+ConditionalOffer = get_model("offer", "ConditionalOffer")
+Condition = get_model("offer", "Condition")
+Benefit = get_model("offer", "Benefit")
+Range = get_model("offer", "Range")
+RangeProduct = get_model("offer", "RangeProduct")
+Voucher = get_model("voucher", "Voucher")
+Basket = get_model("basket", "Basket")
+Line = get_model("basket", "Line")
+Country = get_model("address", "Country")
+
+
+def _products_touched():
+    "``QuerySet.update`` sends no signals, so the products get a new version"
+    if get_catalogue_version_cache() is not None:
+        transaction.on_commit(lambda: bump_model_versions(Product))
+
+
+def touch_product(sender, instance, **kwargs):
+    """
+    Bump date_updated of the product (and its parent) a stockrecord,
+    attribute value or image belongs to, so the change feed picks it up.
+    """
+    product_id = instance.product_id
+    if product_id is None:
+        return
+
+    Product.objects.filter(Q(pk=product_id) | Q(children__pk=product_id)).update(
+        date_updated=timezone.now()
+    )
+    _products_touched()
+
+
+def touch_product_m2m(sender, instance, action, pk_set, **kwargs):
+    "Bump date_updated of the products whose categories or options changed"
+    if not action.startswith("post_"):
+        return
+
+    product_ids = [instance.pk] if isinstance(instance, Product) else pk_set
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(date_updated=timezone.now())
+        _products_touched()
+
+
+def record_product_tombstone(sender, instance, **kwargs):
+    ProductTombstone.objects.create(product_id=instance.pk, upc=instance.upc)
+    if instance.parent_id is not None:
+        Product.objects.filter(pk=instance.parent_id).update(
+            date_updated=timezone.now()
+        )
+        _products_touched()
+
+
+def _invalidate_products(product_ids, parent_ids=()):
+    """
+    Invalidate the cached representations of the products and of their
+    parents and children, which render parts of each other, once the
+    transaction is committed.
+    """
+    product_ids = set(product_ids) - {None}
+    if not product_ids:
+        return
+
+    related = Product.objects.filter(
+        Q(children__pk__in=product_ids) | Q(parent_id__in=product_ids)
+    ).values_list("pk", flat=True)
+    pks = product_ids | set(parent_ids) | set(related)
+    transaction.on_commit(lambda: invalidate_representations(Product, pks - {None}))
+
+
+def invalidate_product_representation(sender, instance, **kwargs):
+    if get_representation_cache() is None:
+        return
+
+    if isinstance(instance, Product):
+        _invalidate_products([instance.pk], [instance.parent_id])
+    elif isinstance(instance, ProductRecommendation):
+        _invalidate_products([instance.primary_id])
+    else:
+        _invalidate_products([instance.product_id])
+
+
+def invalidate_product_m2m_representation(
+    sender, instance, action, pk_set, **kwargs
+):  # pylint: disable=too-many-arguments
+    if get_representation_cache() is None or not action.startswith("post_"):
+        return
+
+    if isinstance(instance, Product):
+        _invalidate_products([instance.pk])
+    else:
+        _invalidate_products(pk_set or ())
+
+
+def invalidate_all_representations_on_commit(sender, instance, **kwargs):
+    if get_representation_cache() is not None:
+        transaction.on_commit(invalidate_all_representations)
+
+
+def bump_model_versions_on_commit(sender, **kwargs):
+    if get_catalogue_version_cache() is not None:
+        transaction.on_commit(lambda: bump_model_versions(sender))
+
+
+def bump_range_versions_on_commit(sender, action="post_save", **kwargs):
+    "The products, classes and categories of the ranges are rendered too"
+    if get_catalogue_version_cache() is not None and action.startswith("post_"):
+        transaction.on_commit(lambda: bump_model_versions(Range))
+
+
+def invalidate_offer_applications_on_commit(sender, **kwargs):
+    "The offers changed, which changes the totals of every basket too"
+    if get_offer_cache() is not None:
+        transaction.on_commit(invalidate_offer_applications)
+    all_baskets_changed_on_commit(sender, **kwargs)
+
+
+def basket_changed_on_commit(sender, instance=None, basket=None, **kwargs):
+    if basket is not None:  # voucher signals
+        basket_id = basket.pk
+    elif isinstance(instance, Basket):
+        basket_id = instance.pk
+    else:
+        basket_id = instance.basket_id
+    baskets_changed([basket_id])
+
+
+def basket_vouchers_changed(sender, instance, action, pk_set, **kwargs):
+    if action.startswith("post_"):
+        baskets_changed([instance.pk] if isinstance(instance, Basket) else pk_set or ())
+
+
+def all_baskets_changed_on_commit(sender, **kwargs):
+    all_baskets_changed()
+
+
+def clear_api_key_cache_on_commit(sender, **kwargs):
+    "Other processes notice changed api keys once their cache expires"
+    # again on commit, in case another thread cached the key in the meantime
+    api_key_cache.clear()
+    transaction.on_commit(api_key_cache.clear)
+
+
+if settings.TRACK_PRODUCT_CHANGES:
+    for model in (StockRecord, ProductAttributeValue, ProductImage):
+        post_save.connect(touch_product, sender=model)
+        post_delete.connect(touch_product, sender=model)
+
+    post_delete.connect(record_product_tombstone, sender=Product)
+
+    for field in ("categories", "product_options", "recommended_products"):
+        m2m_changed.connect(touch_product_m2m, sender=getattr(Product, field).through)
+
+for model in (
+    Product,
+    ProductAttributeValue,
+    ProductImage,
+    ProductCategory,
+    ProductRecommendation,
+    StockRecord,
+):
+    post_save.connect(invalidate_product_representation, sender=model)
+    post_delete.connect(invalidate_product_representation, sender=model)
+
+for field in ("categories", "product_options", "recommended_products"):
+    m2m_changed.connect(
+        invalidate_product_m2m_representation,
+        sender=getattr(Product, field).through,
+    )
+
+# these are rendered as part of many products
+for model in (Category, ProductClass, ProductAttribute, Option, AttributeOption):
+    post_save.connect(invalidate_all_representations_on_commit, sender=model)
+    post_delete.connect(invalidate_all_representations_on_commit, sender=model)
+
+# the lists of these, and the products, are validated by their versions
+for model in (
+    Product,
+    Category,
+    ProductClass,
+    ProductAttribute,
+    Option,
+    AttributeOption,
+    Country,
+    Range,
+):
+    post_save.connect(bump_model_versions_on_commit, sender=model)
+    post_delete.connect(bump_model_versions_on_commit, sender=model)
+
+for field in Range._meta.many_to_many:
+    through = field.remote_field.through
+    m2m_changed.connect(bump_range_versions_on_commit, sender=through)
+    post_save.connect(bump_range_versions_on_commit, sender=through)
+    post_delete.connect(bump_range_versions_on_commit, sender=through)
+
+# the offers that apply to a basket depend on these, and on the categories of
+# the products, which make up ranges.
+for model in (
+    ConditionalOffer,
+    Condition,
+    Benefit,
+    Range,
+    RangeProduct,
+    Voucher,
+    ProductCategory,
+):
+    post_save.connect(invalidate_offer_applications_on_commit, sender=model)
+    post_delete.connect(invalidate_offer_applications_on_commit, sender=model)
+
+for field in (
+    ConditionalOffer.combinations,
+    Range.included_products,
+    Range.excluded_products,
+    Range.classes,
+    Range.included_categories,
+    Range.excluded_categories,
+    Voucher.offers,
+    Product.categories,
+):
+    m2m_changed.connect(invalidate_offer_applications_on_commit, sender=field.through)
+
+# the summary and the version of a basket change with its lines and vouchers
+for model in (Basket, Line):
+    post_save.connect(basket_changed_on_commit, sender=model)
+    post_delete.connect(basket_changed_on_commit, sender=model)
+
+for signal in (basket_signals.voucher_addition, basket_signals.voucher_removal):
+    signal.connect(basket_changed_on_commit)
+
+m2m_changed.connect(basket_vouchers_changed, sender=Basket.vouchers.through)
+
+# and those of all baskets, and the shipping quotes, change with the prices
+post_save.connect(all_baskets_changed_on_commit, sender=StockRecord)
+post_delete.connect(all_baskets_changed_on_commit, sender=StockRecord)
+
+post_save.connect(clear_api_key_cache_on_commit, sender=ApiKey)
+post_delete.connect(clear_api_key_cache_on_commit, sender=ApiKey)
@@ -0,0 +1,77 @@
+"""
+Renderers for the streaming export endpoints.
+
+Besides ``render``, which renders a complete list of objects, these renderers
+have a ``render_rows`` generator that renders the objects one by one, so a
+response can be streamed without holding all of the data in memory.
+"""
+
+import abc
+import csv
+import io
+import json
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+__all__ = ("NDJSONRenderer", "CSVRenderer")
+
+
+class StreamingRenderer(renderers.BaseRenderer, metaclass=abc.ABCMeta):
+    "Base class of the renderers that can render a response row by row"
+
+    @abc.abstractmethod
+    def render_rows(self, rows):
+        "Yield the rendered bytes of every object in ``rows``"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # errors are rendered as a single row
+        if isinstance(data, dict):
+            data = [data]
+        return b"".join(self.render_rows(data))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    "Renders every object as a line of json"
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    encoder_class = JSONEncoder
+
+    def render_rows(self, rows):
+        for row in rows:
+            line = json.dumps(row, cls=self.encoder_class, ensure_ascii=False)
+            yield line.encode(self.charset) + b"\n"
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    Renders every object as a row of comma separated values, with a header
+    row taken from the first object. Nested values are rendered as json.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    encoder_class = JSONEncoder
+
+    def render_value(self, value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, cls=self.encoder_class, ensure_ascii=False)
+        return value
+
+    def render_rows(self, rows):
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(
+                {key: self.render_value(value) for key, value in row.items()}
+            )
+
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
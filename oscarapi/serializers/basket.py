@@ -13,12 +13,17 @@ from oscarapi.basket import operations
 from oscarapi.serializers.fields import (
     DrillDownHyperlinkedIdentityField,
     DrillDownHyperlinkedRelatedField,
+    HyperlinkedIdentityField,
+    HyperlinkedRelatedField,
 )
 from oscarapi.serializers.utils import (
+    ExpandableFieldsMixin,
     OscarModelSerializer,
     OscarHyperlinkedModelSerializer,
 )
 from oscarapi.serializers.fields import TaxIncludedDecimalField
+from oscarapi.utils.loading import get_api_class
+from oscarapi.utils.urls import resolve_hyperlink
 
 logger = logging.getLogger(__name__)
 
@@ -51,8 +56,10 @@ class VoucherDiscountSerializer(OfferDiscountSerializer):
     voucher = VoucherSerializer(required=False)
 
 
-class BasketSerializer(serializers.HyperlinkedModelSerializer):
-    lines = serializers.HyperlinkedIdentityField(view_name="basket-lines-list")
+class BasketSerializer(ExpandableFieldsMixin, serializers.HyperlinkedModelSerializer):
+    "The lines can be rendered inline by listing them in ``context['expand']``"
+
+    lines = HyperlinkedIdentityField(view_name="basket-lines-list")
     offer_discounts = OfferDiscountSerializer(many=True, required=False)
     total_excl_tax = serializers.DecimalField(
         decimal_places=2, max_digits=12, required=False
@@ -74,13 +81,19 @@ class BasketSerializer(serializers.HyperlinkedModelSerializer):
     )
     currency = serializers.CharField(required=False)
     voucher_discounts = VoucherDiscountSerializer(many=True, required=False)
-    owner = serializers.HyperlinkedRelatedField(
+    owner = HyperlinkedRelatedField(
         view_name="user-detail",
         required=False,
         allow_null=True,
         queryset=User.objects.all(),
     )
 
+    def get_expanded_field(self, field_name):
+        if field_name == "lines":
+            # all_lines has the offer discounts applied
+            return BasketLineSerializer(many=True, read_only=True, source="all_lines")
+        return super(BasketSerializer, self).get_expanded_field(field_name)
+
     class Meta:
         model = Basket
         fields = settings.BASKET_FIELDS
@@ -100,10 +113,12 @@ class LineAttributeSerializer(OscarHyperlinkedModelSerializer):
         fields = "__all__"
 
 
-class BasketLineSerializer(OscarHyperlinkedModelSerializer):
+class BasketLineSerializer(ExpandableFieldsMixin, OscarHyperlinkedModelSerializer):
     """
     This serializer computes the prices of this line by using the basket
     strategy.
+
+    The product can be rendered inline by listing it in ``context["expand"]``.
     """
 
     url = DrillDownHyperlinkedIdentityField(
@@ -149,21 +164,57 @@ class BasketLineSerializer(OscarHyperlinkedModelSerializer):
         model = Line
         fields = settings.BASKETLINE_FIELDS
 
+    def get_expanded_field(self, field_name):
+        if field_name == "product":
+            ProductLinkSerializer = get_api_class(
+                "serializers.product", "ProductLinkSerializer"
+            )
+            return ProductLinkSerializer(read_only=True)
+        return super(BasketLineSerializer, self).get_expanded_field(field_name)
+
     def to_representation(self, instance):
         # This override is needed to reflect offer discounts or strategy
-        # related prices immediately in the response
-        operations.assign_basket_strategy(instance.basket, self.context["request"])
+        # related prices immediately in the response. The offers are applied
+        # only once per request, not for every line.
+        basket = operations.get_prepared_basket(
+            instance.basket, self.context["request"]
+        )
 
         # Oscar stores the calculated discount in line._discount_incl_tax or
         # line._discount_excl_tax when offers are applied. So by just
         # retrieving the line from the db you will loose this values, that's
         # why we need to get the line from the in-memory resultset here
-        lines = (x for x in instance.basket.all_lines() if x.id == instance.id)
+        lines = (x for x in basket.all_lines() if x.id == instance.id)
         line = next(lines, None)
 
         return super(BasketLineSerializer, self).to_representation(line)
 
 
+class LineQuantitySerializer(serializers.Serializer):  # pylint: disable=abstract-method
+    """
+    A new quantity for a basket line, a quantity of 0 removes the line. The
+    line is validated to its id only, so many lines can be fetched at once.
+    """
+
+    line = serializers.CharField()
+    quantity = serializers.IntegerField(min_value=0)
+
+    def validate_line(self, value):
+        kwargs = resolve_hyperlink(value, "basket-line-detail")
+        if kwargs is None:
+            raise serializers.ValidationError(_("Invalid hyperlink - No URL match."))
+        return kwargs["pk"]
+
+
+class BasketSummarySerializer(
+    serializers.Serializer
+):  # pylint: disable=abstract-method
+    num_lines = serializers.IntegerField()
+    num_items = serializers.IntegerField()
+    total_incl_tax = serializers.DecimalField(decimal_places=2, max_digits=12)
+    currency = serializers.CharField()
+
+
 class VoucherAddSerializer(serializers.Serializer):
     vouchercode = serializers.CharField(max_length=128, required=True)
 
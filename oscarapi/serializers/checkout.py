@@ -11,15 +11,19 @@ from oscar.core.loading import get_class, get_model
 from rest_framework import exceptions, serializers
 
 from oscarapi import settings
-from oscarapi.utils.loading import get_api_classes
+from oscarapi.utils.loading import get_api_class, get_api_classes
 from oscarapi.basket.operations import assign_basket_strategy
+from oscarapi.basket.shipping import get_default_shipping_quote, get_shipping_quotes
 from oscarapi.utils.settings import overridable
 from oscarapi.serializers.utils import (
+    ExpandableFieldsMixin,
     OscarHyperlinkedModelSerializer,
     OscarModelSerializer,
 )
 from oscarapi.serializers.fields import (
     DrillDownHyperlinkedRelatedField,
+    HyperlinkedIdentityField,
+    HyperlinkedRelatedField,
     TaxIncludedDecimalField,
 )
 
@@ -35,7 +39,6 @@ StockRecord = get_model("partner", "StockRecord")
 
 Basket = get_model("basket", "Basket")
 Country = get_model("address", "Country")
-Repository = get_class("shipping.repository", "Repository")
 
 UserAddress = get_model("address", "UserAddress")
 
@@ -70,7 +73,7 @@ class ShippingAddressSerializer(OscarHyperlinkedModelSerializer):
 
 
 class InlineShippingAddressSerializer(OscarModelSerializer):
-    country = serializers.HyperlinkedRelatedField(
+    country = HyperlinkedRelatedField(
         view_name="country-detail", queryset=Country.objects
     )
 
@@ -86,7 +89,7 @@ class BillingAddressSerializer(OscarHyperlinkedModelSerializer):
 
 
 class InlineBillingAddressSerializer(OscarModelSerializer):
-    country = serializers.HyperlinkedRelatedField(
+    country = HyperlinkedRelatedField(
         view_name="country-detail", queryset=Country.objects
     )
 
@@ -113,17 +116,21 @@ class ShippingMethodSerializer(serializers.Serializer):
 
 
 class OrderLineAttributeSerializer(OscarHyperlinkedModelSerializer):
-    url = serializers.HyperlinkedIdentityField(view_name="order-lineattributes-detail")
+    url = HyperlinkedIdentityField(view_name="order-lineattributes-detail")
 
     class Meta:
         model = OrderLineAttribute
         fields = ["url", "option", "value"]
 
 
-class OrderLineSerializer(OscarHyperlinkedModelSerializer):
-    "This serializer renames some fields so they match up with the basket"
+class OrderLineSerializer(ExpandableFieldsMixin, OscarHyperlinkedModelSerializer):
+    """
+    This serializer renames some fields so they match up with the basket
+
+    The product can be rendered inline by listing it in ``context["expand"]``.
+    """
 
-    url = serializers.HyperlinkedIdentityField(view_name="order-lines-detail")
+    url = HyperlinkedIdentityField(view_name="order-lines-detail")
     attributes = OrderLineAttributeSerializer(many=True, required=False)
     price_currency = serializers.CharField(source="order.currency", max_length=12)
     price_excl_tax = serializers.DecimalField(
@@ -163,6 +170,14 @@ class OrderLineSerializer(OscarHyperlinkedModelSerializer):
             ),
         )
 
+    def get_expanded_field(self, field_name):
+        if field_name == "product":
+            ProductLinkSerializer = get_api_class(
+                "serializers.product", "ProductLinkSerializer"
+            )
+            return ProductLinkSerializer(read_only=True)
+        return super(OrderLineSerializer, self).get_expanded_field(field_name)
+
 
 class OrderOfferDiscountSerializer(OfferDiscountSerializer):
     name = serializers.CharField(source="offer_name")
@@ -179,36 +194,65 @@ class InlineSurchargeSerializer(OscarModelSerializer):
         fields = settings.SURCHARGE_FIELDS
 
 
-class OrderSerializer(OscarHyperlinkedModelSerializer):
+class OrderDiscountsField(serializers.SerializerMethodField):
+    """
+    Renders the basket discounts of an order from its ``discounts``, which
+    the prefetch planner fetches for a whole page of orders at once.
+    """
+
+    related_lookups = ("discounts",)
+
+
+class OrderVoucherDiscountsField(OrderDiscountsField):
+    related_lookups = ("discounts__voucher",)
+
+
+class OrderSerializer(ExpandableFieldsMixin, OscarHyperlinkedModelSerializer):
     """
     The order serializer tries to have the same kind of structure as the
     basket. That way the same kind of logic can be used to display the order
     as the basket in the checkout process.
+
+    The lines can be rendered inline by listing them in ``context["expand"]``.
     """
 
-    owner = serializers.HyperlinkedRelatedField(
+    owner = HyperlinkedRelatedField(
         view_name="user-detail", read_only=True, source="user"
     )
-    lines = serializers.HyperlinkedIdentityField(view_name="order-lines-list")
+    lines = HyperlinkedIdentityField(view_name="order-lines-list")
     shipping_address = InlineShippingAddressSerializer(many=False, required=False)
     billing_address = InlineBillingAddressSerializer(many=False, required=False)
 
     email = serializers.EmailField(read_only=True)
 
     payment_url = serializers.SerializerMethodField()
-    offer_discounts = serializers.SerializerMethodField()
-    voucher_discounts = serializers.SerializerMethodField()
+    offer_discounts = OrderDiscountsField()
+    voucher_discounts = OrderVoucherDiscountsField()
     surcharges = InlineSurchargeSerializer(many=True, required=False)
 
+    def get_basket_discounts(self, obj):
+        # filter in python, so prefetched discounts are used
+        return [
+            discount
+            for discount in obj.discounts.all()
+            if discount.category == discount.BASKET
+        ]
+
     def get_offer_discounts(self, obj):
-        qs = obj.basket_discounts.filter(
-            offer_id__isnull=False, voucher_id__isnull=True
-        )
-        return OrderOfferDiscountSerializer(qs, many=True).data
+        discounts = [
+            discount
+            for discount in self.get_basket_discounts(obj)
+            if discount.offer_id is not None and discount.voucher_id is None
+        ]
+        return OrderOfferDiscountSerializer(discounts, many=True).data
 
     def get_voucher_discounts(self, obj):
-        qs = obj.basket_discounts.filter(voucher_id__isnull=False)
-        return OrderVoucherOfferSerializer(qs, many=True).data
+        discounts = [
+            discount
+            for discount in self.get_basket_discounts(obj)
+            if discount.voucher_id is not None
+        ]
+        return OrderVoucherOfferSerializer(discounts, many=True).data
 
     def get_payment_url(self, obj):
         try:
@@ -222,15 +266,18 @@ class OrderSerializer(OscarHyperlinkedModelSerializer):
             warnings.warn(msg, stacklevel=2)
             return msg
 
+    def get_expanded_field(self, field_name):
+        if field_name == "lines":
+            return OrderLineSerializer(many=True, read_only=True)
+        return super(OrderSerializer, self).get_expanded_field(field_name)
+
     class Meta:
         model = Order
         fields = settings.ORDER_FIELDS
 
 
 class CheckoutSerializer(serializers.Serializer, OrderPlacementMixin):
-    basket = serializers.HyperlinkedRelatedField(
-        view_name="basket-detail", queryset=Basket.objects
-    )
+    basket = HyperlinkedRelatedField(view_name="basket-detail", queryset=Basket.objects)
     guest_email = serializers.EmailField(allow_blank=True, required=False)
     total = serializers.DecimalField(decimal_places=2, max_digits=12, required=False)
     shipping_method_code = serializers.CharField(max_length=128, required=False)
@@ -333,33 +380,20 @@ class CheckoutSerializer(serializers.Serializer, OrderPlacementMixin):
             raise exceptions.NotAcceptable(str(e))
 
     def _shipping_method(self, request, basket, shipping_method_code, shipping_address):
-        repo = Repository()
-
-        default = repo.get_default_shipping_method(
-            basket=basket,
-            user=request.user,
-            request=request,
-            shipping_addr=shipping_address,
-        )
-
+        # the quotes made when the shipping methods were requested are reused
         if shipping_method_code is not None:
-            methods = repo.get_shipping_methods(
-                basket=basket,
-                user=request.user,
-                request=request,
-                shipping_addr=shipping_address,
-            )
-
-            find_method = (s for s in methods if s.code == shipping_method_code)
-            shipping_method = next(find_method, default)
-            return shipping_method
+            quotes = get_shipping_quotes(basket, request, shipping_address)
+            find_method = (s for s in quotes if s.code == shipping_method_code)
+            shipping_method = next(find_method, None)
+            if shipping_method is not None:
+                return shipping_method
 
-        return default
+        return get_default_shipping_quote(basket, request, shipping_address)
 
 
 class UserAddressSerializer(OscarModelSerializer):
-    url = serializers.HyperlinkedIdentityField(view_name="useraddress-detail")
-    country = serializers.HyperlinkedRelatedField(
+    url = HyperlinkedIdentityField(view_name="useraddress-detail")
+    country = HyperlinkedRelatedField(
         view_name="country-detail", queryset=Country.objects
     )
 
@@ -22,6 +22,7 @@ from oscarapi import settings
 from oscarapi.utils.attributes import AttributeFieldBase, attribute_details
 from oscarapi.utils.loading import get_api_class
 from oscarapi.utils.exists import bound_unique_together_get_or_create
+from oscarapi.utils.urls import memoized_reverse
 from .exceptions import FieldError
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,27 @@ class TaxIncludedDecimalField(serializers.DecimalField):
         return self.excl_tax_value
 
 
+class MemoizedReverseMixin(object):
+    """
+    Reverse urls with :func:`oscarapi.utils.urls.memoized_reverse`, so the
+    url pattern is only resolved once per request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MemoizedReverseMixin, self).__init__(*args, **kwargs)
+        self.reverse = memoized_reverse
+
+
+class HyperlinkedIdentityField(
+    MemoizedReverseMixin, relations.HyperlinkedIdentityField
+):
+    pass
+
+
+class HyperlinkedRelatedField(MemoizedReverseMixin, relations.HyperlinkedRelatedField):
+    pass
+
+
 class DrillDownHyperlinkedMixin:
     def __init__(self, *args, **kwargs):
         try:
@@ -81,13 +103,13 @@ class DrillDownHyperlinkedMixin:
 
 
 class DrillDownHyperlinkedIdentityField(
-    DrillDownHyperlinkedMixin, relations.HyperlinkedIdentityField
+    DrillDownHyperlinkedMixin, HyperlinkedIdentityField
 ):
     pass
 
 
 class DrillDownHyperlinkedRelatedField(
-    DrillDownHyperlinkedMixin, relations.HyperlinkedRelatedField
+    DrillDownHyperlinkedMixin, HyperlinkedRelatedField
 ):
     def use_pk_only_optimization(self):
         # we always want the full object so the mixin can filter on the attributes
@@ -104,6 +126,9 @@ class AttributeValueField(AttributeFieldBase, serializers.Field):
     types.
     """
 
+    # relations used by to_representation, for the prefetch planner
+    related_lookups = ("value_option", "value_multi_option")
+
     def __init__(self, **kwargs):
         warnings.warn(
             "AttributeValueField is deprecated and will be removed in a future version of oscarapi",
@@ -198,7 +223,7 @@ class AttributeValueField(AttributeFieldBase, serializers.Field):
         if obj_type == value.attribute.OPTION:
             return value.value.option
         elif obj_type == value.attribute.MULTI_OPTION:
-            return value.value.values_list("option", flat=True)
+            return [option.option for option in value.value.all()]
         elif obj_type in [value.attribute.FILE, value.attribute.IMAGE]:
             if not value.value:
                 return None
@@ -11,20 +11,30 @@ from rest_framework.fields import empty
 from oscar.core.loading import get_model
 
 from oscarapi.utils.exists import bound_unique_together_get_or_create_multiple
-from oscarapi.utils.loading import get_api_classes
+from oscarapi.utils.loading import get_api_classes, get_api_class
 from oscarapi import settings
 from oscarapi.utils.files import file_hash
 from oscarapi.utils.exists import find_existing_attribute_option_group
 from oscarapi.utils.accessors import getitems
-from oscarapi.serializers.fields import DrillDownHyperlinkedIdentityField
+from oscarapi.serializers.fields import (
+    DrillDownHyperlinkedIdentityField,
+    HyperlinkedIdentityField,
+    HyperlinkedRelatedField,
+)
 from oscarapi.utils.attributes import AttributeConverter
+from oscarapi.utils.strategy import get_strategy
+from oscarapi.utils.urls import resolve_hyperlink
 from oscarapi.serializers.utils import (
+    CachedRepresentationMixin,
+    ExpandableFieldsMixin,
     OscarModelSerializer,
     OscarHyperlinkedModelSerializer,
     UpdateListSerializer,
     UpdateForwardManyToManySerializer,
 )
 
+from oscarapi.models import ProductTombstone
+
 from .exceptions import FieldError
 
 logger = logging.getLogger(__name__)
@@ -44,12 +54,11 @@ AttributeValueField, CategoryField, SingleValueSlugRelatedField = get_api_classe
     "serializers.fields",
     ["AttributeValueField", "CategoryField", "SingleValueSlugRelatedField"],
 )
+PriceSerializer = get_api_class("serializers.checkout", "PriceSerializer")
 
 
 class AttributeOptionGroupSerializer(OscarHyperlinkedModelSerializer):
-    url = serializers.HyperlinkedIdentityField(
-        view_name="admin-attributeoptiongroup-detail"
-    )
+    url = HyperlinkedIdentityField(view_name="admin-attributeoptiongroup-detail")
     options = SingleValueSlugRelatedField(
         many=True,
         required=True,
@@ -113,7 +122,7 @@ class BaseCategorySerializer(OscarHyperlinkedModelSerializer):
 
 
 class CategorySerializer(BaseCategorySerializer):
-    children = serializers.HyperlinkedIdentityField(
+    children = HyperlinkedIdentityField(
         view_name="category-child-list",
         lookup_field="full_slug",
         lookup_url_kwarg="breadcrumbs",
@@ -134,9 +143,7 @@ class ProductAttributeListSerializer(UpdateListSerializer):
 
 
 class ProductAttributeSerializer(OscarHyperlinkedModelSerializer):
-    url = serializers.HyperlinkedIdentityField(
-        view_name="admin-productattribute-detail"
-    )
+    url = HyperlinkedIdentityField(view_name="admin-productattribute-detail")
     product_class = serializers.SlugRelatedField(
         slug_field="slug",
         queryset=ProductClass.objects.get_queryset(),
@@ -196,6 +203,38 @@ class OptionSerializer(OscarHyperlinkedModelSerializer):
         list_serializer_class = UpdateForwardManyToManySerializer
 
 
+class ProductOptionListSerializer(UpdateForwardManyToManySerializer):
+    """
+    ``Product.options`` combines the options of the product class with the
+    options of the product in a new queryset, so it can never use prefetched
+    options. When both are prefetched, they are combined here instead.
+    """
+
+    related_lookups = ("product_class__options", "product_options")
+
+    def get_attribute(self, instance):
+        product_class = instance.product_class
+        if (
+            product_class is None
+            or "product_options"
+            not in getattr(instance, "_prefetched_objects_cache", {})
+            or "options" not in getattr(product_class, "_prefetched_objects_cache", {})
+        ):
+            return super(ProductOptionListSerializer, self).get_attribute(instance)
+
+        options = {option.pk: option for option in product_class.options.all()}
+        options.update((option.pk, option) for option in instance.product_options.all())
+        return sorted(
+            options.values(),
+            key=lambda option: (option.order is None, option.order or 0, option.name),
+        )
+
+
+class ProductOptionSerializer(OptionSerializer):
+    class Meta(OptionSerializer.Meta):
+        list_serializer_class = ProductOptionListSerializer
+
+
 class ProductAttributeValueListSerializer(UpdateListSerializer):
     # pylint: disable=unused-argument
     def shortcut_to_internal_value(self, data, productclass, attributes):
@@ -289,7 +328,14 @@ class ProductAttributeValueListSerializer(UpdateListSerializer):
             # use a cached query from product.attr to get the attributes instead
             # if an silly .all() that clones the queryset and performs a new query
             _, product = self.get_name_and_rel_instance(data)
-            iterable = product.attr.get_values()
+            prefetched = getattr(product, "_prefetched_objects_cache", {})
+            if not product.is_child and self.source_attrs[-1] in prefetched:
+                # the values were prefetched for the whole page, so use those.
+                # Child products also show the values of their parent so
+                # those can not use the prefetched values.
+                iterable = data.all()
+            else:
+                iterable = product.attr.get_values()
         else:
             iterable = data
 
@@ -420,8 +466,39 @@ class AvailabilitySerializer(serializers.Serializer):  # pylint: disable=abstrac
     message = serializers.CharField()
 
 
+class PurchaseInfoField(serializers.Field):  # pylint: disable=abstract-method
+    """
+    Renders the price or availability policy of a product inline.
+
+    The purchase info is taken from ``context["purchase_info"]``, where a
+    view can put the purchase info of a whole page of products, fetched with
+    :func:`oscarapi.utils.strategy.fetch_purchase_info`. Otherwise it is
+    fetched for this product only.
+    """
+
+    # the purchase info depends on the strategy
+    cacheable = False
+
+    def __init__(self, policy, serializer_class, **kwargs):
+        self.policy = policy
+        self.serializer_class = serializer_class
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super(PurchaseInfoField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        purchase_info = self.context.get("purchase_info", {}).get(value.pk)
+        if purchase_info is None:
+            strategy = get_strategy(self.context["request"])
+            purchase_info = strategy.fetch_for_product(value)
+
+        return self.serializer_class(
+            getattr(purchase_info, self.policy), context=self.context
+        ).data
+
+
 class RecommmendedProductSerializer(OscarModelSerializer):
-    url = serializers.HyperlinkedIdentityField(view_name="product-detail")
+    url = HyperlinkedIdentityField(view_name="product-detail")
 
     class Meta:
         model = Product
@@ -449,8 +526,8 @@ class BaseProductSerializer(OscarModelSerializer):
     product_class = serializers.SlugRelatedField(
         slug_field="slug", queryset=ProductClass.objects, allow_null=True
     )
-    options = OptionSerializer(many=True, required=False)
-    recommended_products = serializers.HyperlinkedRelatedField(
+    options = ProductOptionSerializer(many=True, required=False)
+    recommended_products = HyperlinkedRelatedField(
         view_name="product-detail",
         many=True,
         required=False,
@@ -494,11 +571,9 @@ class BaseProductSerializer(OscarModelSerializer):
 class PublicProductSerializer(BaseProductSerializer):
     "Serializer base class used for public products api"
 
-    url = serializers.HyperlinkedIdentityField(view_name="product-detail")
-    price = serializers.HyperlinkedIdentityField(
-        view_name="product-price", read_only=True
-    )
-    availability = serializers.HyperlinkedIdentityField(
+    url = HyperlinkedIdentityField(view_name="product-detail")
+    price = HyperlinkedIdentityField(view_name="product-price", read_only=True)
+    availability = HyperlinkedIdentityField(
         view_name="product-availability", read_only=True
     )
 
@@ -513,7 +588,7 @@ class PublicProductSerializer(BaseProductSerializer):
 class ChildProductSerializer(PublicProductSerializer):
     "Serializer for child products"
 
-    parent = serializers.HyperlinkedRelatedField(
+    parent = HyperlinkedRelatedField(
         view_name="product-detail",
         queryset=Product.objects.filter(structure=Product.PARENT),
     )
@@ -525,24 +600,41 @@ class ChildProductSerializer(PublicProductSerializer):
         fields = settings.CHILDPRODUCTDETAIL_FIELDS
 
 
-class ProductSerializer(PublicProductSerializer):
-    "Serializer for public api with strategy fields added for price and availability"
+class ProductSerializer(
+    ExpandableFieldsMixin, CachedRepresentationMixin, PublicProductSerializer
+):
+    """
+    Serializer for public api with strategy fields added for price and availability
 
-    url = serializers.HyperlinkedIdentityField(view_name="product-detail")
-    price = serializers.HyperlinkedIdentityField(
-        view_name="product-price", read_only=True
-    )
-    availability = serializers.HyperlinkedIdentityField(
+    Price, availability and stockrecords can be rendered inline instead of
+    as a hyperlink, by listing them in ``context["expand"]``.
+
+    When ``OSCARAPI_PRODUCT_CACHE`` is set, the representation is cached,
+    except for inline price and availability.
+    """
+
+    url = HyperlinkedIdentityField(view_name="product-detail")
+    price = HyperlinkedIdentityField(view_name="product-price", read_only=True)
+    availability = HyperlinkedIdentityField(
         view_name="product-availability", read_only=True
     )
 
     images = ProductImageSerializer(many=True, required=False)
     children = ChildProductSerializer(many=True, required=False)
 
-    stockrecords = serializers.HyperlinkedIdentityField(
+    stockrecords = HyperlinkedIdentityField(
         view_name="product-stockrecords", read_only=True
     )
 
+    def get_expanded_field(self, field_name):
+        if field_name == "price":
+            return PurchaseInfoField("price", PriceSerializer)
+        if field_name == "availability":
+            return PurchaseInfoField("availability", AvailabilitySerializer)
+        if field_name == "stockrecords":
+            return ProductStockRecordSerializer(many=True, read_only=True)
+        return super(ProductSerializer, self).get_expanded_field(field_name)
+
     class Meta(PublicProductSerializer.Meta):
         fields = settings.PRODUCTDETAIL_FIELDS
 
@@ -559,20 +651,81 @@ class ProductLinkSerializer(ProductSerializer):
         fields = settings.PRODUCT_FIELDS
 
 
+class ProductPurchaseInfoSerializer(OscarModelSerializer):
+    "Price and availability of a product, used to fetch those in bulk"
+
+    url = HyperlinkedIdentityField(view_name="product-detail")
+    price = PurchaseInfoField("price", PriceSerializer)
+    availability = PurchaseInfoField("availability", AvailabilitySerializer)
+
+    class Meta:
+        model = Product
+        fields = ("url", "id", "upc", "price", "availability")
+
+
+class ProductTombstoneSerializer(OscarModelSerializer):
+    "A deleted product, as reported by the product change feed"
+
+    id = serializers.IntegerField(source="product_id")
+
+    class Meta:
+        model = ProductTombstone
+        fields = ("id", "upc", "date_deleted")
+
+
 class OptionValueSerializer(serializers.Serializer):  # pylint: disable=abstract-method
-    option = serializers.HyperlinkedRelatedField(
-        view_name="option-detail", queryset=Option.objects
-    )
+    option = HyperlinkedRelatedField(view_name="option-detail", queryset=Option.objects)
     value = serializers.CharField()
 
 
+class AddProductUrlField(HyperlinkedRelatedField):
+    "Uses the products fetched by :class:`AddProductListSerializer` if there are"
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        products = self.context.get("products", {})
+        pk = view_kwargs.get(self.lookup_url_kwarg)
+        if pk in products:
+            return products[pk]
+        return super(AddProductUrlField, self).get_object(
+            view_name, view_args, view_kwargs
+        )
+
+
+class AddProductListSerializer(
+    serializers.ListSerializer
+):  # pylint: disable=abstract-method
+    """
+    Validates many add to basket requests at once, fetching all the products
+    with a single query.
+    """
+
+    def get_product_ids(self, data):
+        ids = []
+        for item in data:
+            if isinstance(item, dict):
+                kwargs = resolve_hyperlink(item.get("url"), "product-detail")
+                if kwargs is not None:
+                    ids.append(kwargs["pk"])
+        return ids
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context["products"] = Product.objects.prefetch_related(
+                "stockrecords", "product_class", "parent__product_class"
+            ).in_bulk(self.get_product_ids(data))
+        return super(AddProductListSerializer, self).to_internal_value(data)
+
+
 class AddProductSerializer(serializers.Serializer):  # pylint: disable=abstract-method
     """
     Serializes and validates an add to basket request.
     """
 
     quantity = serializers.IntegerField(required=True)
-    url = serializers.HyperlinkedRelatedField(
+    url = AddProductUrlField(
         view_name="product-detail", queryset=Product.objects, required=True
     )
     options = OptionValueSerializer(many=True, required=False)
+
+    class Meta:
+        list_serializer_class = AddProductListSerializer
@@ -1,14 +1,24 @@
 import logging
+from collections import OrderedDict
+
 from django.db import models
 from django.db.models.manager import Manager
 from django.db.models.constants import LOOKUP_SEP
 
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
 
 import oscar.models.fields
 
+from oscarapi import settings
+from oscarapi.utils.cache import (
+    get_representation_cache,
+    get_representation_keys,
+    record_cache_stats,
+)
 from oscarapi.utils.exists import construct_id_filter
-from .fields import ImageUrlField
+from .fields import HyperlinkedIdentityField, HyperlinkedRelatedField, ImageUrlField
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +85,145 @@ class OscarHyperlinkedModelSerializer(
     Correctly map oscar fields to serializer fields.
     """
 
+    serializer_url_field = HyperlinkedIdentityField
+    serializer_related_field = HyperlinkedRelatedField
+
+
+class ExpandableFieldsMixin(object):
+    """
+    Renders the fields listed in ``context["expand"]`` inline instead of as a
+    hyperlink, with the field ``get_expanded_field`` returns for them. They
+    are added when they are not among the fields of the serializer.
+
+    Fields of nested serializers are listed by their dotted path, eg.
+    ``lines.product``.
+    """
+
+    def get_expanded_field(self, field_name):  # pylint: disable=unused-argument
+        return None
+
+    def get_expand_prefix(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.insert(0, node.field_name)
+            node = node.parent
+        return "".join("%s." % name for name in names)
+
+    def get_fields(self):
+        fields = super(ExpandableFieldsMixin, self).get_fields()
+        expand = self.context.get("expand")  # pylint: disable=no-member
+        if expand:
+            prefix = self.get_expand_prefix()
+            for path in sorted(expand):
+                field_name = path[len(prefix) :]
+                if path.startswith(prefix) and "." not in field_name:
+                    # pylint: disable=assignment-from-none
+                    field = self.get_expanded_field(field_name)
+                    if field is not None:
+                        fields[field_name] = field
+        return fields
+
+
+class CachedRepresentationMixin(object):
+    """
+    Caches the representation of a model instance in the cache configured
+    with ``OSCARAPI_PRODUCT_CACHE``.
+
+    Only the fields that render the same for every request to the same host
+    are cached, fields that depend on anything else, like the strategy,
+    should set ``cacheable = False`` and are rendered every time. The cached
+    representations are invalidated by :mod:`oscarapi.receivers`.
+    """
+
+    def get_cache_variant(self):
+        "Everything besides the instance the cached representation depends on"
+        request = self.context.get("request")  # pylint: disable=no-member
+        return "%s.%s:%s:%s:%s" % (
+            type(self).__module__,
+            type(self).__qualname__,
+            ",".join(
+                "%s=%s" % (field.field_name, type(field).__name__)
+                for field in self._readable_fields  # pylint: disable=no-member
+                if getattr(field, "cacheable", True)
+            ),
+            request.build_absolute_uri("/") if request is not None else "",
+            self.context.get("format", ""),  # pylint: disable=no-member
+        )
+
+    def get_cached_representations(self, instances):
+        """
+        Look up the cached representations of ``instances`` in one go and
+        return them by primary key. Instances that are missing are rendered
+        and cached by ``to_representation``.
+        """
+        cache = get_representation_cache()
+        if cache is None:
+            return {}
+
+        # pylint: disable=attribute-defined-outside-init
+        if not hasattr(self, "_representation_keys"):
+            self._representation_keys = {}
+            self._cached_representations = {}
+
+        keys = get_representation_keys(
+            cache,
+            self.Meta.model,  # pylint: disable=no-member
+            [instance.pk for instance in instances],
+            self.get_cache_variant(),
+        )
+        found = cache.get_many(keys.values())
+        cached = {pk: found[key] for pk, key in keys.items() if key in found}
+        record_cache_stats(cache, hits=len(cached), misses=len(keys) - len(cached))
+
+        self._representation_keys.update(keys)
+        self._cached_representations.update(cached)
+        return cached
+
+    def to_representation(self, instance):
+        cache = get_representation_cache()
+        if cache is None or instance.pk is None:
+            return super(CachedRepresentationMixin, self).to_representation(instance)
+
+        if instance.pk not in getattr(self, "_representation_keys", {}):
+            self.get_cached_representations([instance])
+        cached = self._cached_representations.get(instance.pk)
+
+        ret = OrderedDict()
+        representation = {}
+        for field in self._readable_fields:  # pylint: disable=no-member
+            cacheable = getattr(field, "cacheable", True)
+            if cacheable and cached is not None:
+                if field.field_name in cached:
+                    ret[field.field_name] = cached[field.field_name]
+                continue
+
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+
+            check_for_none = (
+                attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            )
+            if check_for_none is None:
+                ret[field.field_name] = None
+            else:
+                ret[field.field_name] = field.to_representation(attribute)
+
+            if cacheable:
+                representation[field.field_name] = ret[field.field_name]
+
+        if cached is None:
+            cache.set(
+                self._representation_keys[instance.pk],
+                representation,
+                timeout=settings.PRODUCT_CACHE_TIMEOUT,
+            )
+
+        return ret
+
 
 class DelayUniqueSerializerMixin(object):
     def get_unique_together_validators(self):
@@ -36,6 +36,95 @@ FILE_DOWNLOADER_MODULE = overridable(
     "OSCARAPI_FILE_DOWNLOADER_MODULE", default="download.default"
 )
 
+#: The maximum number of products the price and availability of which can be
+#: requested at once from the ``product-purchase-info-list`` endpoint.
+PURCHASE_INFO_MAX_PRODUCTS = overridable("OSCARAPI_PURCHASE_INFO_MAX_PRODUCTS", 250)
+
+#: The maximum number of products that can be added to the basket at once
+#: with the ``api-basket-add-products`` endpoint.
+ADD_PRODUCTS_MAX_PRODUCTS = overridable("OSCARAPI_ADD_PRODUCTS_MAX_PRODUCTS", 100)
+
+#: Keep track of product changes for the ``product-change-list`` endpoint and
+#: the validators of the product endpoints. When enabled, changes to the
+#: stockrecords, attribute values, images, categories, options and
+#: recommendations of a product update its ``date_updated`` and deleted
+#: products leave a tombstone.
+TRACK_PRODUCT_CHANGES = overridable("OSCARAPI_TRACK_PRODUCT_CHANGES", True)
+
+#: The number of seconds before changes are reported by the
+#: ``product-change-list`` endpoint, so a change whose transaction commits
+#: after a later change was reported is not skipped by the cursor.
+CHANGE_FEED_DELAY = overridable("OSCARAPI_CHANGE_FEED_DELAY", 5)
+
+#: The number of days the tombstones of deleted products are kept for the
+#: ``product-change-list`` endpoint, see the ``oscarapi_prune_tombstones``
+#: command. Leave to None to keep them forever.
+PRODUCT_TOMBSTONE_RETENTION_DAYS = overridable(
+    "OSCARAPI_PRODUCT_TOMBSTONE_RETENTION_DAYS", 90
+)
+
+#: The name of the django cache in which the versions of the categories,
+#: options, countries and ranges are stored, which validate the lists of them
+#: and the products. Leave to None to send no validators for them.
+CATALOGUE_VERSION_CACHE = overridable("OSCARAPI_CATALOGUE_VERSION_CACHE", None)
+
+#: The name of the django cache in which the serialized products are cached.
+#: Leave to None to disable the cache. The hits and misses can be inspected
+#: with the oscarapi_product_cache management command.
+PRODUCT_CACHE = overridable("OSCARAPI_PRODUCT_CACHE", None)
+
+#: The number of seconds a serialized product is kept in the cache.
+PRODUCT_CACHE_TIMEOUT = overridable("OSCARAPI_PRODUCT_CACHE_TIMEOUT", 3600)
+
+#: The name of the django cache in which the results of applying the offers
+#: to a basket are cached. Leave to None to disable the cache.
+OFFER_CACHE = overridable("OSCARAPI_OFFER_CACHE", None)
+
+#: The number of seconds the offer applications of a basket are cached, which
+#: is also how long a cached offer might be used after it expired.
+OFFER_CACHE_TIMEOUT = overridable("OSCARAPI_OFFER_CACHE_TIMEOUT", 300)
+
+#: Don't save a basket for an anonymous user until a product or voucher is
+#: added to it. Until then the basket has no id or url.
+LAZY_ANONYMOUS_BASKETS = overridable("OSCARAPI_LAZY_ANONYMOUS_BASKETS", False)
+
+#: Don't create an anonymous header session until something is stored in it.
+LAZY_HEADER_SESSIONS = overridable("OSCARAPI_LAZY_HEADER_SESSIONS", False)
+
+#: The number of seconds :class:`oscarapi.middleware.ApiGatewayMiddleWare`
+#: remembers whether an api key is valid, in every process. ``0`` disables it.
+API_KEY_CACHE_TIMEOUT = overridable("OSCARAPI_API_KEY_CACHE_TIMEOUT", 60)
+
+#: The maximum number of valid, and of invalid, api keys that are remembered.
+API_KEY_CACHE_SIZE = overridable("OSCARAPI_API_KEY_CACHE_SIZE", 1000)
+
+#: Store a sha256 hash of api keys instead of the keys themselves.
+HASH_API_KEYS = overridable("OSCARAPI_HASH_API_KEYS", False)
+
+#: The name of the cache in ``CACHES`` the summaries of baskets are stored in,
+#: for the ``api-basket-summary`` endpoint. ``None`` disables the cache.
+BASKET_SUMMARY_CACHE = overridable("OSCARAPI_BASKET_SUMMARY_CACHE", None)
+
+#: The number of seconds the summary of a basket is cached.
+BASKET_SUMMARY_CACHE_TIMEOUT = overridable("OSCARAPI_BASKET_SUMMARY_CACHE_TIMEOUT", 300)
+
+#: The name of the cache in ``CACHES`` the versions of baskets are stored in,
+#: which are used as the ETags of the basket views. ``None`` disables them.
+#: The cache has to be shared by all processes, so not a ``LocMemCache``.
+BASKET_VERSION_CACHE = overridable("OSCARAPI_BASKET_VERSION_CACHE", None)
+
+#: The name of the cache in ``CACHES`` the quotes of the shipping methods of
+#: baskets are stored in. ``None`` disables the cache.
+SHIPPING_QUOTE_CACHE = overridable("OSCARAPI_SHIPPING_QUOTE_CACHE", None)
+
+#: The number of seconds the shipping quotes of a basket are cached, which is
+#: also how long a changed shipping rate might not be used.
+SHIPPING_QUOTE_CACHE_TIMEOUT = overridable("OSCARAPI_SHIPPING_QUOTE_CACHE_TIMEOUT", 300)
+
+#: The number of products that are fetched and serialized at once by the
+#: ``product-export`` endpoint.
+EXPORT_CHUNK_SIZE = overridable("OSCARAPI_EXPORT_CHUNK_SIZE", 500)
+
 
 VOUCHER_FIELDS = overridable(
     "OSCARAPI_VOUCHER_FIELDS",
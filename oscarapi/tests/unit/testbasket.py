@@ -2,14 +2,22 @@ import json
 from unittest import skipIf
 
 from unittest.mock import patch
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from oscar.core.loading import get_model
 
-from oscarapi.basket.operations import get_basket, get_user_basket
+from oscarapi.basket.operations import Applicator, get_basket, get_user_basket
 from oscarapi.tests.utils import APITest
+from oscarapi.utils.session import (
+    get_session_engine,
+    session_id_from_parsed_session_uri,
+)
 from oscarapi import settings
 
 Basket = get_model("basket", "Basket")
@@ -1046,6 +1054,473 @@ class BasketTest(APITest):
         self.response.assertStatusEqual(200)
         self.response.assertValueEqual("total_incl_tax", "50.00")
 
+    def test_basket_sparse_fieldsets(self):
+        "The lines and their products can be included in the basket"
+        self.response = self.post(
+            "api-basket-add-product",
+            url="http://testserver/api/products/1/",
+            quantity=5,
+        )
+        self.response.assertStatusEqual(200)
+
+        self.response = self.get(
+            "%s?fields=lines,total_incl_tax&expand=lines,lines.product"
+            % reverse("api-basket")
+        )
+        self.response.assertStatusEqual(200)
+        self.assertEqual(sorted(self.response.body), ["lines", "total_incl_tax"])
+        self.assertEqual(len(self.response["lines"]), 1)
+        line = self.response["lines"][0]
+        self.assertEqual(line["quantity"], 5)
+        self.assertEqual(line["price_incl_tax"], "50.00")
+        self.assertEqual(line["product"]["id"], 1)
+
+        self.response = self.get(
+            "%s?fields=product,quantity" % self.response["lines"][0]["url"]
+        )
+        self.assertEqual(
+            self.response.body,
+            {"product": "http://testserver/api/products/1/", "quantity": 5},
+        )
+
+    def test_offers_applied_once_per_request(self):
+        "The offers are applied once per request, not once for every line"
+        for product in (1, 2):
+            self.response = self.post(
+                "api-basket-add-product",
+                url="http://testserver/api/products/%s/" % product,
+                quantity=2,
+            )
+            self.response.assertStatusEqual(200)
+        basket_id = self.response["id"]
+
+        with patch.object(
+            Applicator, "apply", autospec=True, side_effect=Applicator.apply
+        ) as apply:
+            self.response = self.get(reverse("basket-lines-list", args=(basket_id,)))
+            self.response.assertStatusEqual(200)
+            self.assertEqual(len(self.response.body), 2)
+            self.assertEqual(apply.call_count, 1)
+
+            apply.reset_mock()
+            self.response = self.get(
+                "%s?expand=lines" % reverse("basket-detail", args=(basket_id,))
+            )
+            self.response.assertStatusEqual(200)
+            self.assertEqual(len(self.response["lines"]), 2)
+            self.assertEqual(apply.call_count, 1)
+
+        # a change to a line is reflected in the response
+        line_url = self.response["lines"][0]["url"]
+        self.response = self.patch(line_url, quantity=3)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(self.response["quantity"], 3)
+        self.assertEqual(self.response["price_incl_tax"], "30.00")
+
+    @patch("oscarapi.settings.LAZY_ANONYMOUS_BASKETS", True)
+    def test_lazy_anonymous_basket(self):
+        "An anonymous basket is not saved until a product is added"
+        self.response = self.get("api-basket")
+        self.response.assertStatusEqual(200)
+        self.assertIsNone(self.response["id"])
+        self.assertIsNone(self.response["url"])
+        self.assertEqual(self.response["total_incl_tax"], "0.00")
+        self.assertFalse(Basket.objects.exists())
+        self.assertNotIn(
+            django_settings.OSCAR_BASKET_COOKIE_OPEN, self.client.session.keys()
+        )
+
+        self.response = self.post(
+            "api-basket-add-product",
+            url="http://testserver/api/products/1/",
+            quantity=5,
+        )
+        self.response.assertStatusEqual(200)
+        basket_id = self.response["id"]
+        self.assertEqual(Basket.objects.get().pk, basket_id)
+
+        self.response = self.get("api-basket")
+        self.assertEqual(self.response["id"], basket_id)
+        self.assertEqual(Basket.objects.count(), 1)
+
+    def test_basket_session_not_saved_when_unchanged(self):
+        "Reading the basket does not write the session once it knows the basket"
+        self.response = self.get("api-basket")
+        self.response.assertStatusEqual(200)
+        basket_id = self.response["id"]
+        self.assertEqual(
+            self.client.session[django_settings.OSCAR_BASKET_COOKIE_OPEN], basket_id
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.get("api-basket")
+        self.response.assertStatusEqual(200)
+        self.assertEqual(self.response["id"], basket_id)
+        session_writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "django_session" in query["sql"]
+            and not query["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(session_writes, [])
+
+    def test_add_products(self):
+        "Many products can be added at once, applying the offers once"
+        items = [
+            {"url": "http://testserver/api/products/1/", "quantity": 5},
+            {"url": "http://testserver/api/products/2/", "quantity": 3},
+            {"url": "http://testserver/api/products/1/", "quantity": 2},
+        ]
+        with patch.object(
+            Applicator, "apply", autospec=True, side_effect=Applicator.apply
+        ) as apply:
+            self.response = self.api_call(
+                "api-basket-add-products", "POST", manual_data=items
+            )
+            self.response.assertStatusEqual(200)
+            self.assertEqual(apply.call_count, 1)
+
+        basket = Basket.objects.get(pk=self.response["id"])
+        self.assertEqual(
+            sorted(basket.lines.values_list("product_id", "quantity")),
+            [(1, 7), (2, 3)],
+        )
+
+        # the quantities added before count, so nothing is added at all
+        items = [
+            {"url": "http://testserver/api/products/2/", "quantity": 1},
+            {"url": "http://testserver/api/products/1/", "quantity": 10},
+            {"url": "http://testserver/api/products/1/", "quantity": 10},
+        ]
+        self.response = self.api_call(
+            "api-basket-add-products", "POST", manual_data=items
+        )
+        self.response.assertStatusEqual(406)
+        self.assertEqual(self.response["index"], 2)
+        self.assertEqual(
+            sorted(basket.lines.values_list("product_id", "quantity")),
+            [(1, 7), (2, 3)],
+        )
+
+        self.response = self.api_call(
+            "api-basket-add-products",
+            "POST",
+            manual_data=[{"url": "http://testserver/api/products/999/", "quantity": 1}],
+        )
+        self.response.assertStatusEqual(406)
+        self.assertIn("url", self.response["reason"][0])
+
+    @patch("oscarapi.settings.LAZY_ANONYMOUS_BASKETS", True)
+    @override_settings(OSCAR_MAX_BASKET_QUANTITY_THRESHOLD=5)
+    def test_add_products_validation(self):
+        "All products together are validated before the basket is saved"
+        items = [
+            {"url": "http://testserver/api/products/1/", "quantity": 3},
+            {"url": "http://testserver/api/products/2/", "quantity": 3},
+        ]
+        self.response = self.api_call(
+            "api-basket-add-products", "POST", manual_data=items
+        )
+        self.response.assertStatusEqual(406)
+        self.assertEqual(self.response["index"], 1)
+        self.assertFalse(Basket.objects.exists())
+
+        with patch("oscarapi.views.basket.AddProductsView.max_products", 1):
+            self.response = self.api_call(
+                "api-basket-add-products", "POST", manual_data=items
+            )
+            self.response.assertStatusEqual(406)
+            self.assertNotIn("index", self.response.body)
+
+        self.response = self.api_call(
+            "api-basket-add-products", "POST", manual_data=items[:1]
+        )
+        self.response.assertStatusEqual(200)
+        self.assertEqual(Basket.objects.get().num_items, 3)
+
+    def test_bulk_update_lines(self):
+        "The quantities of many lines can be changed at once"
+        self.test_add_products()
+        basket = Basket.objects.get()
+        url = reverse("basket-lines-list", args=(basket.pk,))
+        self.response = self.get(url)
+        lines = {line["product"]: line["url"] for line in self.response.body}
+        product_1 = "http://testserver/api/products/1/"
+        product_2 = "http://testserver/api/products/2/"
+
+        with patch.object(
+            Applicator, "apply", autospec=True, side_effect=Applicator.apply
+        ) as apply:
+            self.response = self.api_call(
+                url,
+                "PATCH",
+                manual_data=[
+                    {"line": lines[product_1], "quantity": 4},
+                    {"line": lines[product_2], "quantity": 0},
+                ],
+            )
+            self.response.assertStatusEqual(200)
+            self.assertEqual(apply.call_count, 1)
+        self.assertEqual(len(self.response.body), 1)
+        self.assertEqual(self.response.body[0]["quantity"], 4)
+        self.assertEqual(self.response.body[0]["price_incl_tax"], "40.00")
+        self.assertEqual(list(basket.lines.values_list("quantity", flat=True)), [4])
+
+        # nothing is changed when a quantity is not allowed
+        self.response = self.api_call(
+            url,
+            "PATCH",
+            manual_data=[
+                {"line": lines[product_1], "quantity": 1},
+                {"line": lines[product_1], "quantity": 100},
+            ],
+        )
+        self.response.assertStatusEqual(406)
+        self.assertEqual(self.response["index"], 1)
+        self.assertEqual(list(basket.lines.values_list("quantity", flat=True)), [4])
+
+        # the basket as a whole can't hold more than the threshold
+        with self.settings(OSCAR_MAX_BASKET_QUANTITY_THRESHOLD=5):
+            self.response = self.api_call(
+                url, "PATCH", manual_data=[{"line": lines[product_1], "quantity": 6}]
+            )
+            self.response.assertStatusEqual(406)
+            self.assertNotIn("index", self.response.body)
+            self.response = self.api_call(
+                url, "PATCH", manual_data=[{"line": lines[product_1], "quantity": 5}]
+            )
+            self.response.assertStatusEqual(200)
+
+        # lines that are not in the basket can't be changed
+        self.response = self.api_call(
+            url, "PATCH", manual_data=[{"line": lines[product_2], "quantity": 1}]
+        )
+        self.response.assertStatusEqual(406)
+
+        self.response = self.api_call(
+            reverse("basket-lines-list", args=(basket.pk + 1,)),
+            "PATCH",
+            manual_data=[{"line": lines[product_1], "quantity": 1}],
+        )
+        self.response.assertStatusEqual(404)
+
+    @patch("oscarapi.settings.BASKET_VERSION_CACHE", "default")
+    def test_bulk_update_lines_etag(self):
+        "Changing many lines at once changes the version of the basket"
+        cache.clear()
+        self.test_add_products()
+        basket = Basket.objects.get()
+        url = reverse("basket-lines-list", args=(basket.pk,))
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        data = json.dumps([{"line": response.json()[0]["url"], "quantity": 1}])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, data, content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @patch("oscarapi.settings.BASKET_SUMMARY_CACHE", "default")
+    def test_basket_summary(self):
+        "The summary of a basket is cached until the basket changes"
+        cache.clear()
+        self.response = self.get("api-basket-summary")
+        self.response.assertStatusEqual(200)
+        self.assertEqual(self.response["num_lines"], 0)
+        self.assertEqual(self.response["total_incl_tax"], "0.00")
+        self.assertFalse(Basket.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_add_products()
+        self.response = self.get("api-basket")
+        basket = self.response.body
+
+        self.response = self.get("api-basket-summary")
+        self.assertEqual(self.response["num_lines"], 2)
+        self.assertEqual(self.response["num_items"], 10)
+        self.assertEqual(self.response["total_incl_tax"], basket["total_incl_tax"])
+        self.assertEqual(self.response["currency"], basket["currency"])
+
+        with patch.object(Applicator, "apply", autospec=True) as apply:
+            self.response = self.get("api-basket-summary")
+            self.assertEqual(self.response["num_items"], 10)
+            self.assertFalse(apply.called)
+
+        url = reverse("basket-lines-list", args=(basket["id"],))
+        self.response = self.get(url)
+        line = self.response.body[0]["url"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = self.api_call(
+                url, "PATCH", manual_data=[{"line": line, "quantity": 0}]
+            )
+            self.response.assertStatusEqual(200)
+
+        self.response = self.get("api-basket-summary")
+        summary = self.response.body
+        self.response = self.get("api-basket")
+        self.assertEqual(summary["num_lines"], 1)
+        self.assertEqual(summary["total_incl_tax"], self.response["total_incl_tax"])
+
+    @patch("oscarapi.settings.BASKET_VERSION_CACHE", "default")
+    def test_basket_etag(self):
+        "Unchanged baskets are not rendered and changes can be made optimistically"
+        cache.clear()
+        self.login("nobody", "nobody")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = self.post(
+                "api-basket-add-product",
+                url="http://testserver/api/products/1/",
+                quantity=5,
+            )
+            self.response.assertStatusEqual(200)
+
+        url = reverse("api-basket")
+        etag = self.client.get(url)["ETag"]
+        with patch.object(Applicator, "apply", autospec=True) as apply:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse(apply.called)
+
+        lines_url = reverse("basket-lines-list", args=(self.response["id"],))
+        response = self.client.get(lines_url)
+        lines_etag = response["ETag"]
+        line_url = response.json()[0]["url"]
+
+        # a change that fails does not use up the version
+        data = json.dumps([{"line": line_url, "quantity": 1000}])
+        response = self.client.patch(
+            lines_url, data, content_type="application/json", HTTP_IF_MATCH=lines_etag
+        )
+        self.assertEqual(response.status_code, 406)
+        response = self.client.get(lines_url, HTTP_IF_NONE_MATCH=lines_etag)
+        self.assertEqual(response.status_code, 304)
+
+        # a change that loses the race is rolled back
+        data = json.dumps([{"line": line_url, "quantity": 2}])
+        with patch("oscarapi.views.utils.claim_basket_version", return_value=False):
+            response = self.client.patch(
+                lines_url,
+                data,
+                content_type="application/json",
+                HTTP_IF_MATCH=lines_etag,
+            )
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Basket.objects.get().lines.get().quantity, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                lines_url, data, content_type="application/json", HTTP_IF_MATCH=etag
+            )
+            self.assertEqual(response.status_code, 412)
+            response = self.client.patch(
+                lines_url,
+                data,
+                content_type="application/json",
+                HTTP_IF_MATCH=lines_etag,
+            )
+            self.assertEqual(response.status_code, 200)
+
+        # the version was used up by the change
+        response = self.client.patch(
+            lines_url, data, content_type="application/json", HTTP_IF_MATCH=lines_etag
+        )
+        self.assertEqual(response.status_code, 412)
+        response = self.client.get(lines_url, HTTP_IF_NONE_MATCH=lines_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["quantity"], 2)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # somebody else can't use up the version
+        self.client.logout()
+        self.login("somebody", "somebody")
+        response = self.client.patch(
+            lines_url, data, content_type="application/json", HTTP_IF_MATCH="*"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @patch("oscarapi.settings.BASKET_VERSION_CACHE", "default")
+    def test_add_products_etag(self):
+        "Products are added with the ETag of the basket"
+        cache.clear()
+        self.login("nobody", "nobody")
+        url = reverse("api-basket")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = self.post(
+                "api-basket-add-product",
+                url="http://testserver/api/products/1/",
+                quantity=1,
+            )
+            self.response.assertStatusEqual(200)
+        etag = self.client.get(url)["ETag"]
+
+        data = json.dumps({"url": "http://testserver/api/products/1/", "quantity": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api-basket-add-product"),
+                data,
+                content_type="application/json",
+                HTTP_IF_MATCH=etag,
+            )
+            self.assertEqual(response.status_code, 200)
+
+        # the basket changed since
+        response = self.client.post(
+            reverse("api-basket-add-product"),
+            data,
+            content_type="application/json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 412)
+        data = json.dumps([{"url": "http://testserver/api/products/2/", "quantity": 1}])
+        response = self.client.post(
+            reverse("api-basket-add-products"),
+            data,
+            content_type="application/json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Basket.objects.get().lines.get().quantity, 2)
+
+        etag = self.client.get(url)["ETag"]
+        response = self.client.post(
+            reverse("api-basket-add-products"),
+            data,
+            content_type="application/json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Basket.objects.get().lines.count(), 2)
+
+    @patch("oscarapi.settings.LAZY_HEADER_SESSIONS", True)
+    def test_lazy_header_sessions(self):
+        "Anonymous header sessions are only created when something is stored"
+        session_id = session_id_from_parsed_session_uri(
+            {"type": "ANON", "realm": "testserver", "session_id": "koe"}
+        )
+        store = get_session_engine().SessionStore
+        with self.settings(SESSION_SAVE_EVERY_REQUEST=True):
+            response = self.get("product-list", session_id="koe")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Session-Id"], "SID:ANON:testserver:koe")
+            self.assertFalse(store().exists(session_id))
+
+            response = self.post(
+                "api-basket-add-product",
+                session_id="koe",
+                url="http://testserver/api/products/1/",
+                quantity=1,
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(store().exists(session_id))
+
+            self.response = self.get("api-basket", session_id="koe")
+            self.assertEqual(self.response["id"], response.data["id"])
+
     def test_add_product_above_stock(self):
         """Test if an anonymous user cannot add more products to his
         basket when stock is not sufficient
@@ -1406,3 +1881,21 @@ class ApiBasketMiddleWareTest(APITest):
             "3",
             "The basket cookie is re-established after accessing the basket when logged out",
         )
+
+    def test_no_basket_lookup_for_requests_without_basket(self):
+        "Requests that don't use a basket don't look one up or create one"
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.get("product-list")
+        self.response.assertStatusEqual(200)
+        self.assertFalse(
+            [q for q in queries.captured_queries if "basket_basket" in q["sql"]]
+        )
+        self.assertFalse(Basket.objects.exists())
+        self.assertNotIn("oscar_open_basket", self.client.cookies)
+
+        self.response = self.get("api-basket")
+        basket_id = self.response["id"]
+        self.response = self.get("product-list")
+        self.assertStartsWith(
+            self.client.cookies["oscar_open_basket"].value, "%s:" % basket_id
+        )
@@ -2,12 +2,17 @@ from decimal import Decimal
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
 from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 
+from oscar.apps.shipping.methods import FixedPrice, Free
 from oscar.core.loading import get_model
 
 from rest_framework.response import Response
+from oscarapi.basket.shipping import Repository
 from oscarapi.tests.utils import APITest
 
 from oscarapi.serializers.checkout import CheckoutSerializer
@@ -405,6 +410,44 @@ class CheckoutTest(APITest):
             "the order url from a line is the same as the one created",
         )
 
+    def test_order_sparse_fieldsets(self):
+        "The lines of an order can be included in the order"
+        self.login(username="nobody", password="nobody")
+        self.test_checkout()
+
+        self.response = self.get(
+            "%s?fields=number,lines&expand=lines,lines.product" % reverse("order-list")
+        )
+        self.response.assertStatusEqual(200)
+        order = self.response.body[0]
+        self.assertEqual(sorted(order), ["lines", "number"])
+        self.assertEqual(len(order["lines"]), 1)
+        self.assertEqual(order["lines"][0]["product"]["id"], 1)
+
+    def test_order_list_queries(self):
+        "Expanding the lines of a page of orders takes a fixed number of queries"
+        self.login(username="nobody", password="nobody")
+        url = "%s?expand=lines,lines.product" % reverse("order-list")
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.response = self.get(url)
+            self.response.assertStatusEqual(200)
+            return len(queries)
+
+        self.test_checkout()
+        num_queries = count_queries()
+
+        # a plan computed for the plain list is not used for expanded lines
+        self.response = self.get("order-list")
+        self.response.assertStatusEqual(200)
+        self.assertEqual(count_queries(), num_queries)
+
+        self.test_checkout()
+        self.test_checkout()
+        self.assertEqual(count_queries(), num_queries)
+        self.assertEqual(len(self.response.body), 3)
+
     def test_order_api_surcharges(self):
         """Surcharges should be shown in the API when they are applied"""
         # and now an order for the user nobody
@@ -523,6 +566,71 @@ class CheckoutTest(APITest):
             },
         )
 
+    @patch("oscarapi.settings.SHIPPING_QUOTE_CACHE", "default")
+    def test_shipping_quotes_reused_at_checkout(self):
+        "The shipping methods are not quoted again when checking out"
+        cache.clear()
+        self.login(username="nobody", password="nobody")
+        response = self.get("api-basket")
+        payload = self._get_common_payload(response.data["url"])
+        payload["shipping_method_code"] = "free-shipping"
+        response = self.post(
+            "api-basket-add-product",
+            url="http://testserver/api/products/1/",
+            quantity=5,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        with patch.object(
+            Repository,
+            "get_shipping_methods",
+            autospec=True,
+            side_effect=Repository.get_shipping_methods,
+        ) as get_shipping_methods:
+            response = self.post(
+                "api-basket-shipping-methods", **payload["shipping_address"]
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_shipping_methods.call_count, 1)
+
+            # another address is quoted again
+            address = {**payload["shipping_address"], "postcode": "1234AB"}
+            response = self.post("api-basket-shipping-methods", **address)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_shipping_methods.call_count, 2)
+
+            response = self.post("api-checkout", **payload)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(get_shipping_methods.call_count, 2)
+
+        order = Order.objects.get(number=response.data["number"])
+        self.assertEqual(order.shipping_code, "free-shipping")
+
+    def test_default_shipping_method_at_checkout(self):
+        "The repository chooses the default shipping method, not the quotes"
+        self.login(username="nobody", password="nobody")
+        response = self.get("api-basket")
+        payload = self._get_common_payload(response.data["url"])
+        del payload["shipping_method_code"]
+        self.post(
+            "api-basket-add-product",
+            url="http://testserver/api/products/1/",
+            quantity=5,
+        )
+
+        methods = (Free(), FixedPrice(Decimal("0.00"), Decimal("0.00")))
+        with patch.object(Repository, "methods", methods), patch.object(
+            Repository,
+            "get_default_shipping_method",
+            autospec=True,
+            return_value=FixedPrice(Decimal("0.00"), Decimal("0.00")),
+        ):
+            response = self.post("api-checkout", **payload)
+            self.assertEqual(response.status_code, 200, response.data)
+
+        order = Order.objects.get(number=response.data["number"])
+        self.assertEqual(order.shipping_code, "fixed-price-shipping")
+
     def test_cart_immutable_after_checkout(self):
         """Prove that the cart can not be changed after checkout."""
         self.login(username="nobody", password="nobody")
@@ -1,12 +1,22 @@
 from unittest.mock import patch
 
 from importlib import import_module
+from io import StringIO
 
 from django.conf import settings
 from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from oscarapi.tests.utils import APITest
-from oscarapi.utils.session import get_session, session_id_from_parsed_session_uri
+from oscarapi.utils.session import (
+    get_session,
+    get_session_engine,
+    purge_expired_sessions,
+    session_id_from_parsed_session_uri,
+)
 
 
 class LoginTest(APITest):
@@ -240,6 +250,109 @@ class SessionTest(APITest):
         with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db"):
             self._run_expired_session_test_for_engine()
 
+    def test_get_session_single_query(self):
+        "Resuming a session takes a single query to the database"
+        with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            session = get_session("session1")
+            session["touched"] = "writesomething"
+            session.save()
+
+            with CaptureQueriesContext(connection) as queries:
+                session = get_session("session1")
+                self.assertEqual(session["touched"], "writesomething")
+            self.assertEqual(len(queries), 1)
+
+            # an expired session is started again with the same id, without
+            # clearing all the other expired sessions
+            session.set_expiry(-100)
+            session.save()
+            with patch.object(
+                get_session_engine().SessionStore, "clear_expired"
+            ) as clear_expired:
+                session = get_session("session1")
+                self.assertFalse(clear_expired.called)
+            self.assertEqual(session.session_key, "session1")
+            self.assertNotIn("touched", session)
+
+            # another request creates it again after the expired one is removed
+            session.set_expiry(-100)
+            session.save()
+            store = get_session_engine().SessionStore
+            save = store.save
+
+            def save_concurrently(self, must_create=False):
+                if must_create and not store().exists(self.session_key):
+                    other = store(self.session_key)
+                    # pylint: disable=protected-access
+                    other._session_cache = {"touched": "concurrently"}
+                    save(other, must_create=True)
+                return save(self, must_create=must_create)
+
+            with patch.object(store, "save", save_concurrently):
+                session = get_session("session1")
+            self.assertEqual(session["touched"], "concurrently")
+
+    def test_purge_sessions(self):
+        "Expired header sessions are deleted in batches"
+        with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            store = get_session_engine().SessionStore
+            for name in ("koe", "kip", "paard"):
+                session_id = session_id_from_parsed_session_uri(
+                    {"type": "ANON", "realm": "testserver", "session_id": name}
+                )
+                session = get_session(session_id)
+                if name != "paard":
+                    session.set_expiry(-100)
+                session.save()
+
+            cookie_session = store()
+            cookie_session.set_expiry(-100)
+            cookie_session.save()
+
+            out = StringIO()
+            call_command("oscarapi_purge_sessions", batch_size=1, pause=0, stdout=out)
+            self.assertIn("deleted 2 expired sessions", out.getvalue())
+            self.assertEqual(store.get_model_class().objects.count(), 2)
+
+            call_command("oscarapi_purge_sessions", all=True, pause=0, stdout=out)
+            self.assertEqual(store.get_model_class().objects.count(), 1)
+
+            with self.assertRaises(CommandError):
+                call_command("oscarapi_purge_sessions", batch_size=0, stdout=out)
+
+    def test_purge_sessions_batches(self):
+        "Every batch continues after the last session of the one before"
+        with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.db"):
+            store = get_session_engine().SessionStore
+            for name in ("koe", "kip", "paard", "schaap", "geit", "ezel"):
+                session = get_session(
+                    session_id_from_parsed_session_uri(
+                        {"type": "ANON", "realm": "testserver", "session_id": name}
+                    )
+                )
+                if name != "ezel":
+                    session.set_expiry(-100)
+                session.save()
+            expired = store.get_model_class().objects.filter(
+                expire_date__lt=timezone.now()
+            )
+            keys = sorted(expired.values_list("pk", flat=True))
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(purge_expired_sessions(batch_size=2), 5)
+            self.assertEqual(store.get_model_class().objects.count(), 1)
+
+            # the keys of every batch are selected once, from where the batch
+            # before left off
+            selects = [
+                query["sql"]
+                for query in queries.captured_queries
+                if "ORDER BY" in query["sql"]
+            ]
+            self.assertEqual(len(selects), 3)
+            self.assertIn(keys[1], selects[1])
+            self.assertIn(keys[3], selects[2])
+
     def _run_expired_session_test_for_engine(self):
         # establish that get_session will return the same session
         # when that session key has not yet expired.
@@ -1,6 +1,8 @@
+from unittest.mock import patch
+
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse
-from django.urls import reverse
+from django.urls import reverse, set_script_prefix
 from django.test import RequestFactory, TestCase
 
 from oscarapi.middleware import (
@@ -9,6 +11,8 @@ from oscarapi.middleware import (
     parse_session_id,
 )
 from oscarapi.models import ApiKey
+from oscarapi.utils.apikey import api_key_cache, hash_api_key
+from oscarapi.utils.request import IsApiRequest, _reverse_api_root
 
 
 class DummyRequest:
@@ -46,6 +50,51 @@ class ApiGatewayMiddleWareTest(TestCase):
         response = ApiGatewayMiddleWare(lambda request: HttpResponse())(request)
         self.assertEqual(response.status_code, 200)
 
+    def test_api_key_cache(self):
+        "Api keys are looked up once, until they change"
+        basket_url = reverse("api-basket")
+        middleware = ApiGatewayMiddleWare(lambda request: HttpResponse())
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                request = self.rf.get(basket_url, HTTP_AUTHORIZATION="testapikey")
+                self.assertEqual(middleware(request).status_code, 200)
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                request = self.rf.get(basket_url, HTTP_AUTHORIZATION="newkey")
+                with self.assertRaises(PermissionDenied):
+                    middleware(request)
+
+        ApiKey.objects.create(key="newkey")
+        request = self.rf.get(basket_url, HTTP_AUTHORIZATION="newkey")
+        self.assertEqual(middleware(request).status_code, 200)
+
+        ApiKey.objects.filter(key="newkey").delete()
+        with self.assertRaises(PermissionDenied):
+            middleware(request)
+
+        # only a limited number of invalid keys is remembered
+        with patch("oscarapi.settings.API_KEY_CACHE_SIZE", 2):
+            for key in ("a", "b", "c"):
+                api_key_cache.set(key, False)
+        self.assertEqual(len(api_key_cache.invalid), 2)
+        self.assertIsNone(api_key_cache.get("a"))
+
+    @patch("oscarapi.settings.HASH_API_KEYS", True)
+    def test_hashed_api_keys(self):
+        api_key = ApiKey.objects.create(key="hashedkey")
+        self.assertNotEqual(api_key.key, "hashedkey")
+        api_key.save()
+        self.assertTrue(ApiKey.objects.filter(key=hash_api_key("hashedkey")).exists())
+
+        request = self.rf.get(reverse("api-basket"), HTTP_AUTHORIZATION="hashedkey")
+        response = ApiGatewayMiddleWare(lambda request: HttpResponse())(request)
+        self.assertEqual(response.status_code, 200)
+
+        # the stored hash itself is not a valid key
+        request = self.rf.get(reverse("api-basket"), HTTP_AUTHORIZATION=api_key.key)
+        with self.assertRaises(PermissionDenied):
+            ApiGatewayMiddleWare(lambda request: HttpResponse())(request)
+
     def test_parse_session_id(self):
         dummy_request = DummyRequest()
 
@@ -111,3 +160,28 @@ class HeaderSessionMiddlewareTest(TestCase):
             response.content,
             b'{"reason": "Can not accept cookie with realm example.com on realm testserver"}',
         )
+
+
+class IsApiRequestTest(TestCase):
+    rf = RequestFactory()
+
+    def test_is_api_request(self):
+        "The api root is reversed once and the answer is kept on the request"
+        with patch("oscarapi.utils.request.reverse", wraps=reverse) as api_reverse:
+            _reverse_api_root.cache_clear()
+            for _ in range(2):
+                request = self.rf.get(reverse("api-basket"))
+                self.assertTrue(IsApiRequest.is_api_request(request))
+                self.assertTrue(IsApiRequest.is_api_request(request))
+                self.assertFalse(IsApiRequest.is_api_request(self.rf.get("/shop/")))
+            self.assertEqual(api_reverse.call_count, 1)
+
+            # the script prefix is part of the api root
+            set_script_prefix("/prefix/")
+            try:
+                request = self.rf.get(reverse("api-basket"))
+                self.assertTrue(request.path.startswith("/prefix/"))
+                self.assertTrue(IsApiRequest.is_api_request(request))
+            finally:
+                set_script_prefix("/")
+            self.assertEqual(api_reverse.call_count, 2)
@@ -1,8 +1,14 @@
+from unittest import mock
+
+from django.core.cache import cache
+
 from oscar.core.loading import get_model
 
+from oscarapi.basket.operations import Applicator
 from oscarapi.tests.utils import APITest
 
 Basket = get_model("basket", "Basket")
+ConditionalOffer = get_model("offer", "ConditionalOffer")
 
 
 class OfferTest(APITest):
@@ -76,3 +82,32 @@ class OfferTest(APITest):
         # this price should be incl discount
         self.assertEqual(self.response["price_incl_tax"], "12.00")
         self.assertEqual(self.response["price_excl_tax"], "12.00")
+
+    @mock.patch("oscarapi.settings.OFFER_CACHE", "default")
+    def test_offer_applications_cache(self):
+        "The offer applications are cached until the basket or the offers change"
+        cache.clear()
+        self.test_basket_discount()
+
+        with mock.patch.object(
+            Applicator, "apply", autospec=True, side_effect=Applicator.apply
+        ) as apply:
+            self.response = self.get("api-basket")
+            self.response.assertValueEqual("total_incl_tax", "42.00")
+            self.response = self.get(self.response["lines"])
+            self.assertEqual(self.response.body[0]["price_incl_tax"], "42.00")
+            self.assertEqual(apply.call_count, 0)
+
+            # the basket changed
+            self.response = self.patch(self.response.body[0]["url"], quantity=2)
+            self.response.assertStatusEqual(200)
+            self.assertEqual(self.response["price_incl_tax"], "12.00")
+            self.assertEqual(apply.call_count, 1)
+
+            # the offers changed
+            with self.captureOnCommitCallbacks(execute=True):
+                ConditionalOffer.objects.update(status=ConditionalOffer.SUSPENDED)
+                ConditionalOffer.objects.first().save()
+            self.response = self.get("api-basket")
+            self.response.assertValueEqual("total_incl_tax", "20.00")
+            self.assertEqual(apply.call_count, 2)
@@ -1,4 +1,5 @@
 from unittest import mock
+import csv
 import decimal
 import datetime
 import json
@@ -6,13 +7,19 @@ import tempfile
 import shutil
 
 from copy import deepcopy
+from io import StringIO
 from os.path import dirname, join
 from unittest import skipIf
 from urllib.error import HTTPError
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.urls import reverse
+from django.db import connection
+from django.db.models import Max
 from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import make_aware
 
 from oscar import VERSION as OSCAR_VERSION
@@ -21,6 +28,9 @@ from oscar.test.factories import ProductFactory
 
 from rest_framework import exceptions
 
+from oscarapi.models import ProductTombstone
+from oscarapi.renderers import StreamingRenderer
+from oscarapi.utils.cache import get_cache_stats
 from oscarapi.utils.exists import find_existing_attribute_option_group
 from oscarapi.tests.utils import APITest
 from oscarapi.serializers.fields import CategoryField
@@ -39,6 +49,7 @@ Category = get_model("catalogue", "Category")
 Option = get_model("catalogue", "Option")
 AttributeOptionGroup = get_model("catalogue", "AttributeOptionGroup")
 StockRecord = get_model("partner", "StockRecord")
+Range = get_model("offer", "Range")
 
 
 class ProductListDetailSerializer(ProductLinkSerializer):
@@ -176,6 +187,447 @@ class ProductTest(APITest):
         )
         self.assertNotIn("images", child, "child should not have images by default")
 
+    @mock.patch("oscarapi.views.product.ProductList.get_serializer_class")
+    def test_productlist_detail_num_queries(self, get_serializer_class):
+        "The number of queries of the product list should not depend on the number of products"
+        get_serializer_class.return_value = ProductListDetailSerializer
+        standalone_products_url = "%s?structure=standalone" % reverse("product-list")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.get(standalone_products_url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(len(self.response.body), 3)
+        num_queries = len(queries)
+
+        for _ in range(5):
+            ProductFactory(categories=None)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.get(standalone_products_url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(len(self.response.body), 8)
+        self.assertEqual(len(queries), num_queries)
+
+    def test_product_list_expand_purchase_info(self):
+        "Price and availability can be included in the product list"
+        url = "%s?expand=price,availability" % reverse("product-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(len(self.response.body), 5)
+        products = {product["id"]: product for product in self.response.body}
+
+        price = self.get(reverse("product-price", args=(1,))).json()
+        availability = self.get(reverse("product-availability", args=(1,))).json()
+        self.assertEqual(products[1]["price"], price)
+        self.assertEqual(products[1]["availability"], availability)
+        for product in products.values():
+            self.assertIn("excl_tax", product["price"])
+            self.assertIn("is_available_to_buy", product["availability"])
+
+    def test_product_list_expand_purchase_info_num_queries(self):
+        "The stockrecords of all products in the list are fetched in one go"
+        url = "%s?expand=price,availability" % reverse("product-list")
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        num_queries = len(queries)
+
+        for _ in range(5):
+            ProductFactory(categories=None)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.get(url)
+        self.assertEqual(len(self.response.body), 10)
+        self.assertEqual(len(queries), num_queries)
+
+    def test_product_purchase_info_list(self):
+        "The price and availability of many products can be fetched at once"
+        url = "%s?ids=1,2&upcs=attrtypestest,doesnotexist" % reverse(
+            "product-purchase-info-list"
+        )
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        products = {product["id"]: product for product in self.response.body}
+        self.assertEqual(sorted(products), [1, 2, 3])
+
+        price = self.get(reverse("product-price", args=(1,))).json()
+        availability = self.get(reverse("product-availability", args=(1,))).json()
+        self.assertEqual(products[1]["price"], price)
+        self.assertEqual(products[1]["availability"], availability)
+        self.assertEqual(products[3]["upc"], "attrtypestest")
+
+    def test_product_purchase_info_list_errors(self):
+        url = "%s?ids=1,henk" % reverse("product-purchase-info-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(400)
+
+        with mock.patch(
+            "oscarapi.views.product.ProductPurchaseInfoList.max_products", 2
+        ):
+            url = "%s?ids=1,2,3" % reverse("product-purchase-info-list")
+            self.response = self.get(url)
+            self.response.assertStatusEqual(400)
+
+    def test_product_list_keyset_pagination(self):
+        "The product list can be paged through with a cursor"
+        url = "%s?cursor=&page_size=2&count=true" % reverse("product-list")
+        ids = []
+        while url is not None:
+            self.response = self.get(url)
+            self.response.assertStatusEqual(200)
+            self.assertEqual(self.response["count"], 5)
+            self.assertLessEqual(len(self.response["results"]), 2)
+            ids += [product["id"] for product in self.response["results"]]
+            url = self.response["next"]
+
+        self.assertEqual(ids, sorted(Product.objects.values_list("id", flat=True)))
+
+        url = "%s?cursor=&ordering=-id" % reverse("product-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertNotIn("count", self.response.body)
+        self.assertIsNone(self.response["next"])
+        self.assertEqual(
+            [product["id"] for product in self.response["results"]], ids[::-1]
+        )
+
+        url = "%s?cursor=&page_size=2&ordering=-date_updated" % reverse("product-list")
+        date_updated_ids = []
+        while url is not None:
+            self.response = self.get(url)
+            self.response.assertStatusEqual(200)
+            date_updated_ids += [product["id"] for product in self.response["results"]]
+            url = self.response["next"]
+        self.assertEqual(sorted(date_updated_ids), ids)
+
+        url = "%s?cursor=&ordering=title" % reverse("product-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(400)
+
+    @mock.patch("oscarapi.views.product.ProductChangeFeedPagination.delay", 0)
+    def test_product_change_list(self):
+        "The change feed reports changed and deleted products since a cursor"
+        url = "%s?page_size=2" % reverse("product-change-list")
+        ids = []
+        while True:
+            self.response = self.get(url)
+            self.response.assertStatusEqual(200)
+            self.assertLessEqual(len(self.response["results"]), 2)
+            self.assertEqual(self.response["deleted"], [])
+            ids += [product["id"] for product in self.response["results"]]
+            url = self.response["next"]
+            if not self.response["has_more"]:
+                break
+
+        self.assertEqual(
+            sorted(ids), sorted(Product.objects.values_list("id", flat=True))
+        )
+        cursor = self.response["cursor"]
+
+        # nothing changed since the last sync
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(self.response["results"], [])
+        self.assertEqual(self.response["cursor"], cursor)
+
+        # a stockrecord change updates the product and its parent
+        child = Product.objects.get(pk=2)
+        child.stockrecords.first().save()
+        product = Product.objects.get(pk=1)
+        upc = product.upc
+        product.delete()
+
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(
+            sorted(product["id"] for product in self.response["results"]),
+            sorted([child.pk, child.parent_id]),
+        )
+        self.assertEqual(self.response["deleted"], [])
+        self.assertTrue(self.response["has_more"])
+
+        # the deletion happened later, so it is on the next page
+        self.response = self.get(self.response["next"])
+        self.response.assertStatusEqual(200)
+        self.assertEqual(self.response["results"], [])
+        self.assertEqual(len(self.response["deleted"]), 1)
+        self.assertEqual(self.response["deleted"][0]["id"], 1)
+        self.assertEqual(self.response["deleted"][0]["upc"], upc)
+        self.assertFalse(self.response["has_more"])
+
+        url = "%s?since=nonsense" % reverse("product-change-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(400)
+
+    def test_product_change_list_delay(self):
+        "Recent changes are reported once they can no longer be committed late"
+        url = reverse("product-change-list")
+        later = Product.objects.aggregate(Max("date_updated"))["date_updated__max"]
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=later + datetime.timedelta(minutes=1),
+        ):
+            self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertFalse(self.response["has_more"])
+        url = self.response["next"]
+
+        product = Product.objects.get(pk=1)
+        product.save()
+        self.response = self.get(url)
+        self.assertEqual(self.response["results"], [])
+        self.assertEqual(self.response["next"], url)
+
+        later = product.date_updated + datetime.timedelta(minutes=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.response = self.get(url)
+        self.assertEqual([p["id"] for p in self.response["results"]], [1])
+
+    def test_prune_tombstones(self):
+        "Tombstones are kept for OSCARAPI_PRODUCT_TOMBSTONE_RETENTION_DAYS"
+        Product.objects.get(pk=1).delete()
+        Product.objects.get(pk=2).delete()
+        ProductTombstone.objects.filter(product_id=1).update(
+            date_deleted=make_aware(datetime.datetime(2020, 1, 1))
+        )
+
+        out = StringIO()
+        call_command("oscarapi_prune_tombstones", stdout=out)
+        self.assertIn("deleted 1 tombstones", out.getvalue())
+        self.assertEqual(
+            list(ProductTombstone.objects.values_list("product_id", flat=True)), [2]
+        )
+
+        call_command("oscarapi_prune_tombstones", days=0, stdout=out)
+        self.assertFalse(ProductTombstone.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("oscarapi_prune_tombstones", days=-1, stdout=out)
+
+    @mock.patch("oscarapi.views.product.ProductExport.chunk_size", 2)
+    def test_product_export(self):
+        "The export streams all products in chunks, as ndjson or csv"
+        url = reverse("product-export")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertNotIn("ETag", response)
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        content = b"".join(response.streaming_content)
+        products = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(
+            [product["id"] for product in products],
+            list(Product.objects.order_by("pk").values_list("pk", flat=True)),
+        )
+        self.response = self.get(reverse("product-detail", args=(products[0]["id"],)))
+        self.assertEqual(products[0], self.response.data)
+
+        # the chunk size does not change the result
+        with mock.patch("oscarapi.views.product.ProductExport.chunk_size", 100):
+            response = self.client.get(url)
+            self.assertEqual(b"".join(response.streaming_content), content)
+
+        response = self.client.get(url, {"format": "csv", "fields": "id,upc,title"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(
+            csv.DictReader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(len(rows), Product.objects.count())
+        self.assertEqual(sorted(rows[0]), ["id", "title", "upc"])
+        self.assertEqual(rows[0]["upc"], Product.objects.order_by("pk").first().upc)
+
+        # renderers have to implement render_rows
+        with self.assertRaises(TypeError):
+            StreamingRenderer()  # pylint: disable=abstract-class-instantiated
+
+    @mock.patch("oscarapi.settings.PRODUCT_CACHE", "default")
+    def test_product_detail_cache(self):
+        "The serialized product is cached until the product changes"
+        cache.clear()
+        url = reverse("product-detail", args=(1,))
+        with CaptureQueriesContext(connection) as uncached:
+            self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(get_cache_stats(), {"hits": 0, "misses": 1})
+        first = self.response.body
+
+        with CaptureQueriesContext(connection) as cached:
+            self.response = self.get(url)
+        self.assertEqual(get_cache_stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(self.response.body, first)
+        self.assertLess(len(cached), len(uncached))
+
+        product = Product.objects.get(pk=1)
+        product.title = "A new title"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.response = self.get(url)
+        self.assertEqual(self.response["title"], "A new title")
+
+        attributes = len(self.response["attributes"])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.attribute_values.first().delete()
+        self.response = self.get(url)
+        self.assertEqual(len(self.response["attributes"]), attributes - 1)
+        self.assertEqual(get_cache_stats(), {"hits": 1, "misses": 3})
+
+        # inline price and availability are never cached
+        url = "%s?expand=price" % reverse("product-list")
+        self.response = self.get(url)
+        self.response.assertStatusEqual(200)
+        self.assertIn("excl_tax", self.response.body[0]["price"])
+
+    @mock.patch("oscarapi.settings.CATALOGUE_VERSION_CACHE", "default")
+    def test_product_conditional_get(self):
+        "The product endpoints answer conditional requests with 304"
+        url = reverse("product-detail", args=(1,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.get(pk=1).stockrecords.first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # the product renders the names of its categories
+        etag = response["ETag"]
+        category = Product.objects.get(pk=1).categories.first()
+        category.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        url = reverse("product-list")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=4).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # the listed products render their product class too
+        etag = response["ETag"]
+        product_class = Product.objects.get(pk=1).get_product_class()
+        with self.captureOnCommitCallbacks(execute=True):
+            product_class.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # stockrecords change the products only when changes are tracked
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=1).stockrecords.first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        with mock.patch("oscarapi.settings.TRACK_PRODUCT_CHANGES", False):
+            self.assertNotIn("ETag", self.client.get(url))
+
+        # the strategy is not part of the validators
+        response = self.client.get("%s?expand=price" % url)
+        self.assertNotIn("ETag", response)
+
+    def test_product_conditional_get_without_versions(self):
+        "Products have no validators when related changes can't be noticed"
+        url = reverse("product-detail", args=(1,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+        with mock.patch("oscarapi.settings.CATALOGUE_VERSION_CACHE", "default"):
+            with mock.patch("oscarapi.settings.TRACK_PRODUCT_CHANGES", False):
+                response = self.client.get(url)
+                self.assertNotIn("ETag", response)
+
+                # the cached representations are invalidated anyway
+                with mock.patch("oscarapi.settings.PRODUCT_CACHE", "default"):
+                    etag = self.client.get(url)["ETag"]
+                    with self.captureOnCommitCallbacks(execute=True):
+                        Product.objects.get(pk=1).stockrecords.first().save()
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+
+    @mock.patch("oscarapi.settings.CATALOGUE_VERSION_CACHE", "default")
+    def test_category_conditional_get(self):
+        "The category list answers conditional requests with 304"
+        url = reverse("category-list")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        category = Category.objects.first()
+        category.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        with mock.patch("oscarapi.settings.CATALOGUE_VERSION_CACHE", None):
+            self.assertNotIn("ETag", self.client.get(url))
+
+    @mock.patch("oscarapi.settings.CATALOGUE_VERSION_CACHE", "default")
+    def test_range_conditional_get(self):
+        "The range list changes with the products of the ranges"
+        rng = Range.objects.create(name="Some products")
+        url = reverse("range-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rng.add_product(Product.objects.get(pk=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            rng.excluded_products.add(Product.objects.get(pk=2))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_sparse_fieldsets(self):
+        "Clients can choose the fields of a product and expand related ones"
+        url = reverse("product-detail", args=(1,))
+        with CaptureQueriesContext(connection) as full:
+            self.response = self.get(url)
+        self.assertIn("attributes", self.response.body)
+
+        with CaptureQueriesContext(connection) as sparse:
+            self.response = self.get("%s?fields=url,title" % url)
+        self.response.assertStatusEqual(200)
+        self.assertEqual(list(self.response.body), ["url", "title"])
+        self.assertLess(len(sparse), len(full))
+
+        self.response = self.get(
+            "%s?fields=title,stockrecords,price&expand=stockrecords,price" % url
+        )
+        self.assertEqual(sorted(self.response.body), ["price", "stockrecords", "title"])
+        self.assertEqual(self.response["stockrecords"][0]["partner_sku"], "clf-large")
+        self.assertIn("excl_tax", self.response["price"])
+
+        # unknown expansions are ignored
+        self.response = self.get("%s?expand=categories" % reverse("product-list"))
+        self.response.assertStatusEqual(200)
+        self.assertNotIn("categories", self.response.body[0])
+
     def test_product_detail(self):
         "Check product details"
         self.response = self.get(reverse("product-detail", args=(1,)))
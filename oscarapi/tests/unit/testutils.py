@@ -1,6 +1,11 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from django.urls import set_script_prefix
 from oscar.core.loading import get_model
+from rest_framework.request import Request
+from rest_framework.reverse import reverse
+
 from oscarapi.utils import exists
+from oscarapi.utils.urls import memoized_reverse
 
 Product = get_model("catalogue", "Product")
 Category = get_model("catalogue", "Category")
@@ -48,3 +53,61 @@ class UtilsExistTest(TestCase):
             ProductAttributeValue, {"attribute": 1, "product": 1, "value_text": "klaas"}
         )
         self.assertEqual(av.id, 1)
+
+
+class MemoizedReverseTest(TestCase):
+    def _request(self, path="/api/products/"):
+        return Request(RequestFactory().get(path))
+
+    def test_memoized_reverse_matches_reverse(self):
+        for format_ in (None, "json"):
+            request = self._request()
+            for pk in (1, 22, 333):
+                self.assertEqual(
+                    memoized_reverse(
+                        "product-detail",
+                        kwargs={"pk": pk},
+                        request=request,
+                        format=format_,
+                    ),
+                    reverse(
+                        "product-detail",
+                        kwargs={"pk": pk},
+                        request=request,
+                        format=format_,
+                    ),
+                )
+            kwargs = {"product_pk": 3, "pk": 4}
+            self.assertEqual(
+                memoized_reverse(
+                    "product-stockrecord-detail",
+                    kwargs=kwargs,
+                    request=request,
+                    format=format_,
+                ),
+                reverse(
+                    "product-stockrecord-detail",
+                    kwargs=kwargs,
+                    request=request,
+                    format=format_,
+                ),
+            )
+            # pylint: disable=protected-access
+            self.assertEqual(len(request._oscarapi_url_templates), 2)
+
+    def test_memoized_reverse_script_prefix(self):
+        request = self._request()
+        set_script_prefix("/shop/")
+        try:
+            url = memoized_reverse("product-detail", kwargs={"pk": 5}, request=request)
+        finally:
+            set_script_prefix("/")
+        self.assertEqual(url, "http://testserver/shop/api/products/5/")
+
+    def test_memoized_reverse_fallback(self):
+        request = self._request()
+        self.assertEqual(
+            memoized_reverse("product-detail", kwargs={"pk": "5"}, request=request),
+            "http://testserver/api/products/5/",
+        )
+        self.assertFalse(hasattr(request, "_oscarapi_url_templates"))
@@ -1,3 +1,8 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.urls import reverse
 from django.utils import timezone
 
 from oscar.core.loading import get_model
@@ -61,6 +66,47 @@ class VoucherTest(APITest):
         self.response = self.get("api-basket")
         self.response.assertValueEqual("total_incl_tax", "15.00")
 
+    @patch("oscarapi.settings.BASKET_VERSION_CACHE", "default")
+    def test_basket_add_voucher_etag(self):
+        "A voucher is not added to a basket that changed since it was retrieved"
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = self.post(
+                "api-basket-add-product",
+                url="http://testserver/api/products/1/",
+                quantity=2,
+            )
+            self.response.assertStatusEqual(200)
+        etag = self.client.get(reverse("api-basket"))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = self.post(
+                "api-basket-add-product",
+                url="http://testserver/api/products/1/",
+                quantity=1,
+            )
+            self.response.assertStatusEqual(200)
+
+        data = json.dumps({"vouchercode": "TESTVOUCHER"})
+        response = self.client.post(
+            reverse("api-basket-add-voucher"),
+            data,
+            content_type="application/json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 412)
+        self.assertFalse(Basket.objects.get().vouchers.exists())
+
+        etag = self.client.get(reverse("api-basket"))["ETag"]
+        response = self.client.post(
+            reverse("api-basket-add-voucher"),
+            data,
+            content_type="application/json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Basket.objects.get().vouchers.exists())
+
     def test_lowercase_voucher(self):
         """Lowercase vouchers should be working as well"""
         # first add two products to our basket
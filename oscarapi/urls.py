@@ -11,7 +11,9 @@ LoginView, UserDetail, RegistrationView = get_api_classes(
 )
 (
     BasketView,
+    BasketSummaryView,
     AddProductView,
+    AddProductsView,
     AddVoucherView,
     ShippingMethodView,
     LineList,
@@ -20,7 +22,9 @@ LoginView, UserDetail, RegistrationView = get_api_classes(
     "views.basket",
     [
         "BasketView",
+        "BasketSummaryView",
         "AddProductView",
+        "AddProductsView",
         "AddVoucherView",
         "ShippingMethodView",
         "LineList",
@@ -64,6 +68,9 @@ StockRecordDetail, PartnerList, PartnerDetail = get_api_classes(
     ProductStockRecordDetail,
     ProductPrice,
     ProductAvailability,
+    ProductPurchaseInfoList,
+    ProductChangeList,
+    ProductExport,
     CategoryList,
     CategoryDetail,
 ) = get_api_classes(
@@ -75,6 +82,9 @@ StockRecordDetail, PartnerList, PartnerDetail = get_api_classes(
         "ProductStockRecordDetail",
         "ProductPrice",
         "ProductAvailability",
+        "ProductPurchaseInfoList",
+        "ProductChangeList",
+        "ProductExport",
         "CategoryList",
         "CategoryDetail",
     ],
@@ -169,9 +179,15 @@ urlpatterns = [
     path("register/", RegistrationView.as_view(), name="api-register"),
     path("login/", LoginView.as_view(), name="api-login"),
     path("basket/", BasketView.as_view(), name="api-basket"),
+    path("basket/summary/", BasketSummaryView.as_view(), name="api-basket-summary"),
     path(
         "basket/add-product/", AddProductView.as_view(), name="api-basket-add-product"
     ),
+    path(
+        "basket/add-products/",
+        AddProductsView.as_view(),
+        name="api-basket-add-products",
+    ),
     path(
         "basket/add-voucher/", AddVoucherView.as_view(), name="api-basket-add-voucher"
     ),
@@ -195,6 +211,13 @@ urlpatterns = [
     ),
     path("products/", ProductList.as_view(), name="product-list"),
     path("products/<int:pk>/", ProductDetail.as_view(), name="product-detail"),
+    path(
+        "products/purchase-info/",
+        ProductPurchaseInfoList.as_view(),
+        name="product-purchase-info-list",
+    ),
+    path("products/changes/", ProductChangeList.as_view(), name="product-change-list"),
+    path("products/export/", ProductExport.as_view(), name="product-export"),
     path("products/<int:pk>/price/", ProductPrice.as_view(), name="product-price"),
     path(
         "products/<int:pk>/availability/",
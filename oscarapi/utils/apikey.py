@@ -0,0 +1,84 @@
+"""
+Validation of the api keys of :class:`oscarapi.middleware.ApiGatewayMiddleWare`.
+
+Every api request is checked against the ``ApiKey`` table, so the outcome is
+cached in the process for ``OSCARAPI_API_KEY_CACHE_TIMEOUT`` seconds. Only
+digests of the keys are kept in memory, and the number of invalid keys is
+bounded, so clients sending random keys can't grow the cache.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from oscarapi import settings
+
+__all__ = ("hash_api_key", "is_hashed_api_key", "ApiKeyCache", "api_key_cache")
+
+HASH_PREFIX = "sha256$"
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def hash_api_key(key):
+    "Return the hash of ``key`` that is stored when ``OSCARAPI_HASH_API_KEYS`` is on"
+    return HASH_PREFIX + _digest(key)
+
+
+def is_hashed_api_key(key):
+    "Tell if ``key`` was hashed by ``hash_api_key`` already"
+    return key.startswith(HASH_PREFIX)
+
+
+class ApiKeyCache(object):
+    """
+    A least recently used cache of whether keys are valid, with a time to
+    live. Valid and invalid keys are kept apart, so invalid keys can't push
+    out the valid ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.valid = OrderedDict()
+        self.invalid = OrderedDict()
+
+    def get(self, key):
+        "Return whether ``key`` is valid, or None if that is not cached"
+        digest = _digest(key)
+        now = time.monotonic()
+        with self.lock:
+            for is_valid, entries in ((True, self.valid), (False, self.invalid)):
+                expires = entries.get(digest)
+                if expires is None:
+                    continue
+                if expires < now:
+                    del entries[digest]
+                    return None
+                entries.move_to_end(digest)
+                return is_valid
+        return None
+
+    def set(self, key, is_valid):
+        timeout = settings.API_KEY_CACHE_TIMEOUT
+        if not timeout:
+            return
+
+        digest = _digest(key)
+        entries = self.valid if is_valid else self.invalid
+        with self.lock:
+            entries[digest] = time.monotonic() + timeout
+            entries.move_to_end(digest)
+            while len(entries) > settings.API_KEY_CACHE_SIZE:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.valid.clear()
+            self.invalid.clear()
+
+
+#: the cache used by the gateway middleware, cleared when api keys change
+api_key_cache = ApiKeyCache()
@@ -0,0 +1,214 @@
+"""
+A versioned cache for serialized representations.
+
+Every representation is cached under the current version of the instance it
+represents, so invalidating an instance is a matter of giving it a new
+version, no matter for how many serializers, field sets or hosts it was
+cached. Representations stored under an old version are never read again and
+expire on their own.
+
+Models without a modification date, like categories and countries, have a
+version as a whole as well, which is used to validate the lists of them.
+
+The versions of the other caches of oscarapi, eg. of the basket summaries and
+offer applications, are kept with :func:`get_version` and
+:func:`bump_version` as well.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import caches
+
+from oscarapi import settings
+
+__all__ = (
+    "get_version",
+    "get_versions",
+    "bump_version",
+    "bump_versions",
+    "get_representation_cache",
+    "get_representation_keys",
+    "get_representation_version",
+    "invalidate_representations",
+    "invalidate_all_representations",
+    "record_cache_stats",
+    "get_cache_stats",
+    "reset_cache_stats",
+    "get_catalogue_version_cache",
+    "get_model_versions",
+    "bump_model_versions",
+)
+
+GLOBAL_VERSION_KEY = "oscarapi:version"
+MODEL_VERSION_KEY = "oscarapi:model-version"
+HITS_KEY = "oscarapi:representation:hits"
+MISSES_KEY = "oscarapi:representation:misses"
+
+
+def get_representation_cache():
+    "Return the cache configured with ``OSCARAPI_PRODUCT_CACHE`` or None"
+    if settings.PRODUCT_CACHE is None:
+        return None
+    return caches[settings.PRODUCT_CACHE]
+
+
+def _version_key(model, pk):
+    return "%s:%s:%s" % (GLOBAL_VERSION_KEY, model._meta.label_lower, pk)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_versions(cache, keys):
+    """
+    Return a dictionary with the version stored in ``cache`` under every key
+    in ``keys``. A version that is missing, because it was never set or
+    evicted, starts at the current time in nanoseconds, so versions only ever
+    increase.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # add does not overwrite a version another process just set
+        for key in missing:
+            cache.add(key, _new_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_version(cache, key):
+    "Return the version stored in ``cache`` under ``key``, see get_versions"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(cache, keys):
+    "Give every key in ``keys`` the same new version"
+    version = _new_version()
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def bump_version(cache, key):
+    "Give ``key`` a new version"
+    cache.set(key, _new_version(), timeout=None)
+
+
+def get_representation_keys(cache, model, pks, variant):
+    """
+    Return a dictionary with the cache key of the representation of every
+    instance of ``model`` in ``pks``. The ``variant`` should describe
+    everything besides the instance the representation depends on, eg. the
+    serializer and the fields that are rendered.
+    """
+    version_keys = {pk: _version_key(model, pk) for pk in pks}
+    versions = get_versions(cache, [GLOBAL_VERSION_KEY] + list(version_keys.values()))
+    global_version = versions[GLOBAL_VERSION_KEY]
+
+    keys = {}
+    for pk, version_key in version_keys.items():
+        key = "%s:%s:%s:%s" % (
+            global_version,
+            version_key,
+            versions[version_key],
+            variant,
+        )
+        keys[pk] = "oscarapi:representation:%s" % hashlib.md5(key.encode()).hexdigest()
+    return keys
+
+
+def get_representation_version(model, pk):
+    """
+    Return the global version and the version of the instance of ``model``
+    with ``pk`` its representations are cached under, or None when the cache
+    is disabled. Versions are the time they were made, in nanoseconds.
+    """
+    cache = get_representation_cache()
+    if cache is None:
+        return None
+
+    keys = [GLOBAL_VERSION_KEY, _version_key(model, pk)]
+    versions = get_versions(cache, keys)
+    return tuple(versions[key] for key in keys)
+
+
+def invalidate_representations(model, pks):
+    "Give the instances of ``model`` in ``pks`` a new version"
+    cache = get_representation_cache()
+    if cache is not None and pks:
+        bump_versions(cache, [_version_key(model, pk) for pk in pks])
+
+
+def invalidate_all_representations():
+    "Invalidate every cached representation at once"
+    cache = get_representation_cache()
+    if cache is not None:
+        bump_version(cache, GLOBAL_VERSION_KEY)
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def record_cache_stats(cache, hits=0, misses=0):
+    if hits:
+        _incr(cache, HITS_KEY, hits)
+    if misses:
+        _incr(cache, MISSES_KEY, misses)
+
+
+def get_cache_stats():
+    "Return the number of hits and misses of the representation cache"
+    cache = get_representation_cache()
+    if cache is None:
+        return {"hits": 0, "misses": 0}
+
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": stats.get(HITS_KEY, 0), "misses": stats.get(MISSES_KEY, 0)}
+
+
+def reset_cache_stats():
+    cache = get_representation_cache()
+    if cache is not None:
+        cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def get_catalogue_version_cache():
+    "Return the cache configured with ``OSCARAPI_CATALOGUE_VERSION_CACHE`` or None"
+    if settings.CATALOGUE_VERSION_CACHE is None:
+        return None
+    return caches[settings.CATALOGUE_VERSION_CACHE]
+
+
+def _model_version_key(model):
+    return "%s:%s" % (MODEL_VERSION_KEY, model._meta.label_lower)
+
+
+def get_model_versions(*models):
+    """
+    Return the versions of all the instances of every model in ``models``,
+    which change whenever one of them is saved or deleted, or None when the
+    cache is disabled.
+    """
+    cache = get_catalogue_version_cache()
+    if cache is None:
+        return None
+
+    keys = [_model_version_key(model) for model in models]
+    versions = get_versions(cache, keys)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_model_versions(*models):
+    "Give all the instances of ``models`` a new version"
+    cache = get_catalogue_version_cache()
+    if cache is not None:
+        bump_versions(cache, [_model_version_key(model) for model in models])
@@ -0,0 +1,178 @@
+"""
+This module contains a planner that derives the ``select_related`` and
+``prefetch_related`` lookups a queryset needs from the fields of the
+serializer that is going to render it.
+
+Fields that use relations which can not be derived from their ``source``
+(eg. ``source="*"`` or a model property) can name them by setting a
+``related_lookups`` attribute.
+
+Because the plan is computed from the bound fields of the serializer that is
+actually used, it follows the ``OSCARAPI_*_FIELDS`` settings and any
+serializer overrides loaded with
+:func:`oscarapi.utils.loading.get_api_classes`.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet, prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField
+
+from oscarapi.serializers.fields import DrillDownHyperlinkedMixin
+
+__all__ = ("get_related_lookups", "prefetch_for_serializer")
+
+# plans are keyed on the fields a client asked for, so keep only the most
+# recently used ones around.
+PLAN_CACHE_SIZE = 256
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def _relation_path(model, attrs):
+    """
+    Return the longest prefix of ``attrs`` that follows model relations,
+    whether any of those relations is multi valued, and the model at the end
+    of the path.
+    """
+    path = []
+    many = False
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+
+        # attname lookups like product_id are not relations we can follow
+        if not field.is_relation or field.related_model is None or field.name != attr:
+            break
+
+        path.append(attr)
+        many = many or field.many_to_many or field.one_to_many
+        model = field.related_model
+
+    return path, many, model
+
+
+def _plan_serializer(serializer, model, prefix, in_prefetch, plan):
+    select_related, prefetch_related = plan
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+        elif isinstance(field, ManyRelatedField):
+            child = field.child_relation
+        else:
+            child = field
+
+        paths = [field.source_attrs]
+        if isinstance(child, DrillDownHyperlinkedMixin):
+            paths.extend(p.split(".") for p in child.extra_url_kwargs.values())
+        paths.extend(
+            lookup.split(LOOKUP_SEP) for lookup in getattr(field, "related_lookups", ())
+        )
+
+        for attrs in paths:
+            path, many, related_model = _relation_path(model, attrs)
+            if not path:
+                continue
+
+            lookup = prefix + LOOKUP_SEP.join(path)
+            if in_prefetch or many:
+                prefetch_related.add(lookup)
+            else:
+                select_related.add(lookup)
+
+            # only descend into nested serializers whose source is a relation
+            # all the way, otherwise we don't know what model they render.
+            if attrs is field.source_attrs and len(path) == len(attrs):
+                if isinstance(child, serializers.BaseSerializer):
+                    _plan_serializer(
+                        child,
+                        related_model,
+                        lookup + LOOKUP_SEP,
+                        in_prefetch or many,
+                        plan,
+                    )
+
+
+def get_related_lookups(serializer, model=None):
+    """
+    Compute the ``(select_related, prefetch_related)`` lookups needed to
+    render ``serializer`` without issuing queries per object.
+
+    The plan is cached per serializer class, rendered fields and expanded
+    fields, for the last :data:`PLAN_CACHE_SIZE` of those combinations.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    if model is None:
+        model = serializer.Meta.model
+
+    key = (
+        type(serializer),
+        model,
+        tuple((name, type(field)) for name, field in serializer.fields.items()),
+        frozenset(serializer.context.get("expand") or ()),
+    )
+    with _plan_cache_lock:
+        lookups = _plan_cache.get(key)
+        if lookups is not None:
+            _plan_cache.move_to_end(key)
+            return lookups
+
+    plan = (set(), set())
+    _plan_serializer(serializer, model, "", False, plan)
+    select_related, prefetch_related = plan
+    lookups = (tuple(sorted(select_related)), tuple(sorted(prefetch_related)))
+
+    with _plan_cache_lock:
+        _plan_cache[key] = lookups
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return lookups
+
+
+def prefetch_for_serializer(instance, serializer):
+    """
+    Make sure everything ``serializer`` needs to render ``instance`` is
+    fetched with a fixed number of queries.
+
+    Querysets get ``select_related`` and ``prefetch_related`` applied,
+    instances or lists of instances that were already fetched (eg. a page)
+    get their relations prefetched in place, unless their representation is
+    cached.
+    """
+    if isinstance(instance, QuerySet):
+        select_related, prefetch_related = get_related_lookups(
+            serializer, instance.model
+        )
+        if select_related:
+            instance = instance.select_related(*select_related)
+        if prefetch_related:
+            instance = instance.prefetch_related(*prefetch_related)
+        return instance
+
+    select_related, prefetch_related = get_related_lookups(serializer)
+    if select_related or prefetch_related:
+        instances = instance if isinstance(instance, list) else [instance]
+
+        # there is no need to fetch anything for cached representations
+        child = getattr(serializer, "child", serializer)
+        if hasattr(child, "get_cached_representations"):
+            cached = child.get_cached_representations(instances)
+            instances = [obj for obj in instances if obj.pk not in cached]
+
+        prefetch_related_objects(instances, *select_related, *prefetch_related)
+
+    return instance
@@ -1,4 +1,7 @@
-from django.urls import reverse
+import functools
+
+from django.conf import settings
+from django.urls import get_script_prefix, get_urlconf, reverse
 
 
 def get_domain(request):
@@ -17,9 +20,25 @@ def get_domain(request):
     return request.get_host().split(":")[0]
 
 
+@functools.lru_cache(maxsize=None)
+def _reverse_api_root(urlconf, script_prefix):  # pylint: disable=unused-argument
+    return reverse("api-root", urlconf=urlconf).lower()
+
+
+def get_api_root():
+    "The lower cased path of the api, reversed once per urlconf and script prefix"
+    return _reverse_api_root(
+        get_urlconf() or settings.ROOT_URLCONF, get_script_prefix()
+    )
+
+
 class IsApiRequest(object):
     @staticmethod
     def is_api_request(request):
-        path = request.path.lower()
-        api_root = reverse("api-root").lower()
-        return path.startswith(api_root)
+        # several middlewares ask for every request
+        is_api_request = getattr(request, "_oscarapi_is_api_request", None)
+        if is_api_request is None:
+            is_api_request = request.path.lower().startswith(get_api_root())
+            # pylint: disable=protected-access
+            request._oscarapi_is_api_request = is_api_request
+        return is_api_request
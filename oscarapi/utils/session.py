@@ -1,8 +1,13 @@
+import functools
 import hashlib
+import time
 from importlib import import_module
 
 from django.conf import settings
 from django.contrib import auth
+from django.contrib.sessions.backends.base import CreateError
+from django.db.models.functions import Length
+from django.utils import timezone
 
 from rest_framework import exceptions
 
@@ -39,31 +44,142 @@ def login_and_upgrade_session(request, user):
     request.session.save()
 
 
+# the length of a sha1 hexdigest, which cookie session keys never have
+HEADER_SESSION_KEY_LENGTH = 40
+
+
 def session_id_from_parsed_session_uri(parsed_session_uri):
     session_id_base = "SID:%(type)s:%(realm)s:%(session_id)s" % (parsed_session_uri)
     combined = session_id_base + settings.SECRET_KEY
     return hashlib.sha1(combined.encode()).hexdigest()
 
 
-def get_session(session_id, raise_on_create=False):
-    "get a session with the id specified."
-    engine = import_module(settings.SESSION_ENGINE)
-    session = engine.SessionStore(session_id)
+@functools.lru_cache(maxsize=None)
+def _import_session_engine(name):
+    return import_module(name)
+
+
+def get_session_engine():
+    "Return the module of ``SESSION_ENGINE``, which is imported only once"
+    return _import_session_engine(settings.SESSION_ENGINE)
+
 
-    if not session.exists(session_id):
-        if raise_on_create:
-            raise exceptions.NotAuthenticated()
+class DeferredSessionMixin(object):
+    """
+    A session with a key chosen by the client, that is only created in the
+    session backend once something is stored in it.
+    """
+
+    deferred = True
+
+    def save(self, must_create=False):
+        if self.deferred:
+            if not self._session:  # pylint: disable=no-member
+                return
+            try:
+                super(DeferredSessionMixin, self).save(must_create=True)
+            except CreateError:
+                # created by another request or expired, either way it's ours
+                super(DeferredSessionMixin, self).save()
+            self.deferred = False
         else:
-            session.save(must_create=True)
-    else:
-        # if we get an expired session from django,
-        # the session key will change after calling load.
-        # since the whole point of get_session is to retrieve a session
-        # with exactly the key specified, we have to clear the expired
-        # sessions and then get a new session.
-        session.load()
-        if session.session_key != session_id:
-            engine.SessionStore.clear_expired()
-            session = get_session(session_id, raise_on_create)
+            super(DeferredSessionMixin, self).save(must_create=must_create)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_deferred_session_store(session_store):
+    return type(
+        "Deferred%s" % session_store.__name__,
+        (DeferredSessionMixin, session_store),
+        # the data is signed with the qualified name of the session store
+        {"__qualname__": session_store.__qualname__},
+    )
+
+
+def _resume_session(engine, session_id):
+    session = engine.SessionStore(session_id)
+    # the session key is reset when the session does not exist or expired
+    data = session.load()
+    if session.session_key != session_id:
+        return None
+
+    session._session_cache = data  # pylint: disable=protected-access
+    return session
+
+
+def get_session(session_id, raise_on_create=False, defer_create=False):
+    """
+    Get a session with the id specified.
+
+    Loading a session tells if it exists as well, so resuming a session
+    takes a single call to the session backend. With ``defer_create`` a
+    session that does not exist is only created when something is stored in
+    it, see :class:`DeferredSessionMixin`.
+    """
+    engine = get_session_engine()
+    session = _resume_session(engine, session_id)
+    if session is not None:
+        return session
+
+    if raise_on_create:
+        raise exceptions.NotAuthenticated()
+
+    if defer_create:
+        session = _get_deferred_session_store(engine.SessionStore)(session_id)
+        session._session_cache = {}  # pylint: disable=protected-access
+        return session
+
+    # since the whole point of get_session is to retrieve a session with
+    # exactly the key specified, a new session is created with that key.
+    session = engine.SessionStore(session_id)
+    try:
+        session.save(must_create=True)
+    except CreateError:
+        # another request created the session in the meantime, or it expired
+        # but was not removed yet, in which case only that session is removed.
+        session = _resume_session(engine, session_id)
+        if session is None:
+            engine.SessionStore().delete(session_id)
+            session = engine.SessionStore(session_id)
+            try:
+                session.save(must_create=True)
+            except CreateError:
+                # yet another request created it after it was removed
+                session = _resume_session(engine, session_id)
+                if session is None:
+                    raise
 
     return session
+
+
+def purge_expired_sessions(batch_size=1000, pause=0, header_sessions_only=True):
+    """
+    Delete the expired sessions of a database backed session engine in
+    batches of ``batch_size``, pausing ``pause`` seconds between batches, so
+    the sessions table is never locked for long. Returns the number of
+    sessions that were deleted.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size should be at least 1")
+
+    model = get_session_engine().SessionStore.get_model_class()
+    expired = model.objects.filter(expire_date__lt=timezone.now())
+    if header_sessions_only:
+        expired = expired.alias(key_length=Length("session_key")).filter(
+            key_length=HEADER_SESSION_KEY_LENGTH
+        )
+
+    # every batch continues after the last key of the one before, so the
+    # sessions that were already skipped are not scanned again
+    expired = expired.order_by("pk")
+    deleted = 0
+    last_key = None
+    while True:
+        batch = expired if last_key is None else expired.filter(pk__gt=last_key)
+        keys = list(batch.values_list("pk", flat=True)[:batch_size])
+        if keys:
+            deleted += model.objects.filter(pk__in=keys).delete()[0]
+            last_key = keys[-1]
+        if len(keys) < batch_size:
+            return deleted
+        time.sleep(pause)
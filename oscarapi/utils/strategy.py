@@ -0,0 +1,29 @@
+from django.db.models import prefetch_related_objects
+
+from oscar.core.loading import get_class
+
+Selector = get_class("partner.strategy", "Selector")
+
+
+def get_strategy(request):
+    "Get the strategy for this request"
+    if hasattr(request, "strategy"):
+        return request.strategy
+
+    # oscar's basket middleware did not run, so there is no strategy yet.
+    return Selector().strategy(request=request, user=request.user)
+
+
+def fetch_purchase_info(strategy, products):
+    """
+    Fetch the purchase info for a batch of products.
+
+    The stockrecords and product classes of all the products are loaded with
+    a single query each before the strategy is run over the batch. Returns a
+    dictionary of purchase info by product id.
+    """
+    products = list(products)
+    prefetch_related_objects(
+        products, "stockrecords", "product_class", "parent__product_class"
+    )
+    return {product.pk: strategy.fetch_for_product(product) for product in products}
@@ -0,0 +1,91 @@
+"""
+Memoized reversing of hyperlinks.
+
+Reversing a url and making it absolute is a lot of work for something that
+only differs in the ids from one object to the next. :func:`memoized_reverse`
+reverses every url pattern once per request, with placeholder ids, and just
+formats the ids into the result after that. Because the template is made
+with a regular reverse, ``format`` suffixes, script prefixes and versioning
+are taken into account.
+"""
+
+from urllib.parse import urlparse
+
+from django.urls import Resolver404, get_script_prefix, resolve
+
+from rest_framework.reverse import reverse
+
+__all__ = ("memoized_reverse", "resolve_hyperlink")
+
+# big enough to never be a real id, but still matching <int:...> converters
+_PLACEHOLDER = 7319024658160
+
+
+def _get_template(viewname, names, request, format):  # pylint: disable=W0622
+    placeholders = {name: _PLACEHOLDER + i for i, name in enumerate(names)}
+    # reverse adds the format to the kwargs it is passed, so pass a copy
+    url = reverse(viewname, kwargs=dict(placeholders), request=request, format=format)
+
+    template = url.replace("%", "%%")
+    for name, placeholder in placeholders.items():
+        if template.count(str(placeholder)) != 1:
+            return None
+        template = template.replace(str(placeholder), "%%(%s)s" % name)
+    return template
+
+
+def memoized_reverse(
+    viewname, args=None, kwargs=None, request=None, format=None, **extra
+):  # pylint: disable=redefined-builtin
+    """
+    Same as :func:`rest_framework.reverse.reverse`, but url patterns with
+    integer keyword arguments are reversed only once per request.
+    """
+    if (
+        request is None
+        or args
+        or extra
+        or not kwargs
+        or not all(type(value) is int for value in kwargs.values())
+    ):
+        return reverse(
+            viewname, args=args, kwargs=kwargs, request=request, format=format, **extra
+        )
+
+    templates = getattr(request, "_oscarapi_url_templates", None)
+    if templates is None:
+        templates = request._oscarapi_url_templates = {}
+
+    names = tuple(sorted(kwargs))
+    key = (viewname, names, format)
+    if key not in templates:
+        templates[key] = _get_template(viewname, names, request, format)
+
+    template = templates[key]
+    if template is None:
+        return reverse(viewname, kwargs=kwargs, request=request, format=format)
+    return template % kwargs
+
+
+def resolve_hyperlink(url, url_name):
+    """
+    Return the keyword arguments of ``url`` if it is a hyperlink to the
+    ``url_name`` view, or None otherwise. Unlike a hyperlinked related field
+    this doesn't fetch anything, so many hyperlinks can be resolved before
+    fetching all the objects at once.
+    """
+    if not isinstance(url, str):
+        return None
+
+    path = urlparse(url).path
+    prefix = get_script_prefix()
+    if path.startswith(prefix):
+        path = "/" + path[len(prefix) :]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+
+    if match.url_name != url_name:
+        return None
+    return match.kwargs
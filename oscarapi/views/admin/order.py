@@ -3,6 +3,7 @@ from rest_framework import generics
 
 from oscar.core.loading import get_model
 from oscarapi.utils.loading import get_api_classes, get_api_class
+from oscarapi.views.utils import KeysetPaginationMixin
 
 APIAdminPermission = get_api_class("permissions", "APIAdminPermission")
 Order = get_model("order", "Order")
@@ -23,10 +24,11 @@ OrderLineAttribute = get_model("order", "LineAttribute")
 )
 
 
-class OrderAdminList(generics.ListAPIView):
+class OrderAdminList(KeysetPaginationMixin, generics.ListAPIView):
     serializer_class = AdminOrderSerializer
     queryset = Order.objects.get_queryset().order_by("-date_placed")
     permission_classes = (APIAdminPermission,)
+    keyset_orderings = ("-date_placed", "date_placed")
 
 
 class OrderAdminDetail(generics.RetrieveDestroyAPIView):
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from oscarapi.utils.loading import get_api_class
+from oscarapi.views.utils import KeysetPaginationMixin
 from rest_framework import generics
 
 APIAdminPermission = get_api_class("permissions", "APIAdminPermission")
@@ -7,7 +8,7 @@ AdminUserSerializer = get_api_class("serializers.admin.user", "AdminUserSerializ
 User = get_user_model()
 
 
-class UserAdminList(generics.ListCreateAPIView):
+class UserAdminList(KeysetPaginationMixin, generics.ListCreateAPIView):
     """
     List of all users, either frontend or admin users.
     The fields shown in this view can be changed using the ``OSCARAPI_ADMIN_USER_FIELDS``
@@ -17,6 +18,7 @@ class UserAdminList(generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = AdminUserSerializer
     permission_classes = (APIAdminPermission,)
+    keyset_orderings = ("id", "-id")
 
 
 class UserAdminDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -11,11 +11,18 @@ from oscarapi.basket.operations import (
     assign_basket_strategy,
     editable_baskets,
     get_anonymous_basket,
+    invalidate_prepared_basket,
     prepare_basket,
 )
+from oscarapi.utils.cache import get_model_versions
 from oscarapi.utils.loading import get_api_classes, get_api_class
 
-from .utils import QuerySetList
+from .utils import (
+    BasketVersionMixin,
+    ConditionalGetMixin,
+    QuerySetList,
+    SparseFieldsetMixin,
+)
 
 __all__ = (
     "BasketList",
@@ -50,23 +57,30 @@ CountrySerializer = get_api_class("serializers.checkout", "CountrySerializer")
 )
 
 
-class CountryList(generics.ListAPIView):
+class CountryList(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CountrySerializer
     queryset = Country.objects.all()
 
+    def get_version(self):
+        return get_model_versions(Country)
+
 
 class CountryDetail(generics.RetrieveAPIView):
     serializer_class = CountrySerializer
     queryset = Country.objects.all()
 
 
-class BasketList(generics.ListAPIView):
+class BasketList(SparseFieldsetMixin, generics.ListAPIView):
     """
     Retrieve all baskets that belong to the current (authenticated) user.
+
+    The fields can be chosen with ``?fields=`` and the lines can be included
+    instead of as a hyperlink with ``?expand=lines``.
     """
 
     serializer_class = BasketSerializer
     queryset = editable_baskets()
+    expandable_fields = ("lines", "lines.product")
 
     def get_queryset(self):
         qs = super(BasketList, self).get_queryset()
@@ -83,15 +97,25 @@ class BasketList(generics.ListAPIView):
         return QuerySetList(mapped_with_baskets, qs)
 
 
-class BasketDetail(generics.RetrieveUpdateDestroyAPIView):
+class BasketDetail(
+    BasketVersionMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = BasketSerializer
     permission_classes = (permissions.RequestAllowsAccessTo,)
     queryset = editable_baskets()
+    expandable_fields = ("lines", "lines.product")
+
+    def get_basket_id(self):
+        return super(BasketDetail, self).get_object().pk
 
     def get_object(self):
         basket = super(BasketDetail, self).get_object()
         return assign_basket_strategy(basket, self.request)
 
+    def perform_update(self, serializer):
+        super(BasketDetail, self).perform_update(serializer)
+        invalidate_prepared_basket(serializer.instance, self.request)
+
 
 class LineAttributeDetail(generics.RetrieveUpdateAPIView):
     queryset = LineAttribute.objects.all()
@@ -99,20 +123,26 @@ class LineAttributeDetail(generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.RequestAllowsAccessTo,)
 
 
-class OptionList(generics.ListAPIView):
+class OptionList(ConditionalGetMixin, generics.ListAPIView):
     queryset = Option.objects.all()
     serializer_class = OptionSerializer
 
+    def get_version(self):
+        return get_model_versions(Option)
+
 
 class OptionDetail(generics.RetrieveAPIView):
     queryset = Option.objects.all()
     serializer_class = OptionSerializer
 
 
-class RangeList(generics.ListAPIView):
+class RangeList(ConditionalGetMixin, generics.ListAPIView):
     queryset = Range.objects.all()
     serializer_class = RangeSerializer
 
+    def get_version(self):
+        return get_model_versions(Range)
+
 
 class RangeDetail(generics.RetrieveAPIView):
     queryset = Range.objects.all()
@@ -1,22 +1,37 @@
 # pylint: disable=W0632
+from collections import Counter
+
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from oscar.apps.basket import signals
-from oscar.core.loading import get_model, get_class
+from oscar.core.loading import get_model
 
 from rest_framework import status, generics, exceptions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from oscarapi import permissions
+from oscarapi import permissions, settings
 from oscarapi.basket import operations
+from oscarapi.basket.invalidation import baskets_changed
+from oscarapi.basket.shipping import get_shipping_quotes
+from oscarapi.basket.summary import get_basket_summary
 from oscarapi.utils.loading import get_api_classes, get_api_class
-from oscarapi.views.utils import BasketPermissionMixin
+from oscarapi.utils.strategy import get_strategy
+from oscarapi.views.utils import (
+    BasketPermissionMixin,
+    BasketVersionMixin,
+    SparseFieldsetMixin,
+)
 
 __all__ = (
     "BasketView",
+    "BasketSummaryView",
     "LineList",
     "AddProductView",
+    "AddProductsView",
     "BasketLineDetail",
     "AddVoucherView",
     "ShippingMethodView",
@@ -24,20 +39,23 @@ __all__ = (
 
 Basket = get_model("basket", "Basket")
 Line = get_model("basket", "Line")
-Repository = get_class("shipping.repository", "Repository")
 ShippingAddress = get_model("order", "ShippingAddress")
 (  # pylint: disable=unbalanced-tuple-unpacking
     BasketSerializer,
+    BasketSummarySerializer,
     VoucherAddSerializer,
     VoucherSerializer,
     BasketLineSerializer,
+    LineQuantitySerializer,
 ) = get_api_classes(
     "serializers.basket",
     [
         "BasketSerializer",
+        "BasketSummarySerializer",
         "VoucherAddSerializer",
         "VoucherSerializer",
         "BasketLineSerializer",
+        "LineQuantitySerializer",
     ],
 )
 AddProductSerializer = get_api_class("serializers.product", "AddProductSerializer")
@@ -49,23 +67,68 @@ AddProductSerializer = get_api_class("serializers.product", "AddProductSerialize
 )
 
 
-class BasketView(APIView):
+class UserBasketVersionMixin(BasketVersionMixin):
+    "Uses the version of the basket of the user or the session."
+
+    def get_basket_id(self):
+        if self.request.user.is_authenticated:
+            baskets = Basket.open.filter(owner=self.request.user)
+            return baskets.values_list("pk", flat=True).first()
+        return operations.get_basket_id_from_session(self.request)
+
+
+class BasketAdditionVersionMixin(UserBasketVersionMixin):
+    """
+    The views that add to the basket have no representation of their own, so
+    they use the ETag of ``api-basket``. A client can add to the basket it
+    retrieved with an ``If-Match`` header.
+    """
+
+    def get_etag_url(self):
+        return self.request.build_absolute_uri(reverse("api-basket"))
+
+
+class BasketView(UserBasketVersionMixin, SparseFieldsetMixin, generics.RetrieveAPIView):
     """
     Api for retrieving a user's basket.
 
     GET:
-    Retrieve your basket.
+    Retrieve your basket. The fields can be chosen and the lines can be
+    included instead of as a hyperlink, eg::
+
+        http://127.0.0.1:8000/api/basket/?fields=url,lines,total_incl_tax&expand=lines
     """
 
     serializer_class = BasketSerializer
+    expandable_fields = ("lines", "lines.product")
+
+    def get_object(self):
+        return operations.get_basket(self.request)
+
+
+class BasketSummaryView(APIView):
+    """
+    Api for retrieving the number of lines and items, the total and the
+    currency of a user's basket, eg. for a badge in the header of every page.
+
+    GET:
+    Retrieve the summary of your basket. A basket is not created for an
+    anonymous user that has none.
+    """
+
+    serializer_class = BasketSummarySerializer
 
     def get(self, request, *args, **kwargs):  # pylint: disable=redefined-builtin
-        basket = operations.get_basket(request)
-        ser = self.serializer_class(basket, context={"request": request})
+        if request.user.is_authenticated:
+            basket = operations.get_user_basket(request.user)
+        else:
+            basket = operations.get_anonymous_basket(request) or Basket()
+
+        ser = self.serializer_class(get_basket_summary(basket, request))
         return Response(ser.data)
 
 
-class AddProductView(APIView):
+class AddProductView(BasketAdditionVersionMixin, APIView):
     """
     Add a certain quantity of a product to the basket.
 
@@ -129,6 +192,7 @@ class AddProductView(APIView):
                     {"reason": message}, status=status.HTTP_406_NOT_ACCEPTABLE
                 )
 
+            operations.save_basket(basket, request)
             basket.add_product(product, quantity=quantity, options=options)
 
             signals.basket_addition.send(
@@ -142,7 +206,103 @@ class AddProductView(APIView):
         return Response({"reason": p_ser.errors}, status=status.HTTP_406_NOT_ACCEPTABLE)
 
 
-class AddVoucherView(APIView):
+class AddProductsView(AddProductView):
+    """
+    Add many products to the basket at once.
+
+    POST([{url, quantity, options}, ...])
+    [
+        {
+            "url": "http://testserver.org/oscarapi/products/209/",
+            "quantity": 6
+        },
+        {
+            "url": "http://testserver.org/oscarapi/products/210/",
+            "quantity": 1
+        }
+    ]
+
+    Every product is validated like in ``AddProductView``, counting the
+    products before it, and at most ``OSCARAPI_ADD_PRODUCTS_MAX_PRODUCTS``
+    can be added at once. Either all of them are added or, when one of them
+    can not be added, none of them is and 406 is returned with the ``reason``
+    and the ``index`` of that product. The offers are applied once, after all
+    the products have been added.
+    """
+
+    max_products = settings.ADD_PRODUCTS_MAX_PRODUCTS
+
+    def validate_items(self, basket, items):
+        """
+        Validate the items against the basket and the items before them,
+        without adding anything yet. Returns the index of the first item that
+        can not be added and the reason, or None.
+        """
+        quantities = Counter()
+        for index, item in enumerate(items):
+            product = item["url"]
+            quantities[product.pk] += item["quantity"]
+            basket_valid, message = self.validate(
+                basket, product, quantities[product.pk], item.get("options", [])
+            )
+            if basket_valid:
+                # the other products added before count towards the threshold
+                basket_valid, message = basket.is_quantity_allowed(
+                    sum(quantities.values())
+                )
+            if not basket_valid:
+                return index, message
+        return None
+
+    def post(self, request, *args, **kwargs):  # pylint: disable=redefined-builtin
+        if isinstance(request.data, list) and len(request.data) > self.max_products:
+            return Response(
+                {
+                    "reason": _(
+                        "No more than %(max_products)s products can be added at once"
+                    )
+                    % {"max_products": self.max_products}
+                },
+                status=status.HTTP_406_NOT_ACCEPTABLE,
+            )
+
+        p_ser = self.add_product_serializer_class(
+            data=request.data, many=True, context={"request": request}
+        )
+        if not p_ser.is_valid():
+            return Response(
+                {"reason": p_ser.errors}, status=status.HTTP_406_NOT_ACCEPTABLE
+            )
+
+        basket = operations.get_basket(request)
+        invalid = self.validate_items(basket, p_ser.validated_data)
+        if invalid is not None:
+            index, message = invalid
+            return Response(
+                {"reason": message, "index": index},
+                status=status.HTTP_406_NOT_ACCEPTABLE,
+            )
+
+        with transaction.atomic():
+            operations.save_basket(basket, request)
+            for item in p_ser.validated_data:
+                basket.add_product(
+                    item["url"],
+                    quantity=item["quantity"],
+                    options=item.get("options", []),
+                )
+
+            for item in p_ser.validated_data:
+                signals.basket_addition.send(
+                    sender=self, product=item["url"], user=request.user, request=request
+                )
+
+        operations.apply_offers(request, basket)
+        ser = self.serializer_class(basket, context={"request": request})
+        return Response(ser.data)
+
+
+class AddVoucherView(BasketAdditionVersionMixin, APIView):
     """
     Add a voucher to the basket.
 
@@ -166,6 +326,7 @@ class AddVoucherView(APIView):
             basket = operations.get_basket(request)
 
             voucher = v_ser.instance
+            operations.save_basket(basket, request)
             basket.vouchers.add(voucher)
 
             signals.voucher_addition.send(sender=None, basket=basket, voucher=voucher)
@@ -180,6 +341,7 @@ class AddVoucherView(APIView):
                     break
             else:
                 basket.vouchers.remove(voucher)
+                operations.invalidate_prepared_basket(basket, request)
                 return Response(
                     {
                         "reason": _(
@@ -225,14 +387,9 @@ class ShippingMethodView(APIView):
 
     def _get(self, request, shipping_address=None):  # pylint: disable=redefined-builtin
         basket = operations.get_basket(request)
-        shiping_methods = Repository().get_shipping_methods(
-            basket=basket,
-            user=request.user,
-            shipping_addr=shipping_address,
-            request=request,
-        )
+        shipping_quotes = get_shipping_quotes(basket, request, shipping_address)
         ser = self.shipping_method_serializer_class(
-            shiping_methods, many=True, context={"basket": basket}
+            shipping_quotes, many=True, context={"basket": basket}
         )
         return Response(ser.data)
 
@@ -254,7 +411,12 @@ class ShippingMethodView(APIView):
         return Response(s_ser.errors, status=status.HTTP_406_NOT_ACCEPTABLE)
 
 
-class LineList(BasketPermissionMixin, generics.ListCreateAPIView):
+class LineList(
+    BasketVersionMixin,
+    BasketPermissionMixin,
+    SparseFieldsetMixin,
+    generics.ListCreateAPIView,
+):
     """
     Api for adding lines to a basket.
 
@@ -263,7 +425,10 @@ class LineList(BasketPermissionMixin, generics.ListCreateAPIView):
     staff users may access any basket.
 
     GET:
-    A list of basket lines.
+    A list of basket lines. The fields can be chosen and the products can be
+    included instead of as a hyperlink, eg::
+
+        http://127.0.0.1:8000/api/baskets/1/lines/?fields=product,quantity&expand=product
 
     POST(basket, line_reference, product, stockrecord,
          quantity, price_currency, price_excl_tax, price_incl_tax):
@@ -280,18 +445,45 @@ class LineList(BasketPermissionMixin, generics.ListCreateAPIView):
             "price_excl_tax": "100.0",
             "price_incl_tax": "121.0"
         }
+
+    PATCH([{line, quantity}, ...]):
+    Change the quantities of many lines at once, a quantity of 0 removes the
+    line, example::
+
+        [
+            {
+                "line": "http://127.0.0.1:8000/oscarapi/baskets/100/lines/1/",
+                "quantity": 2
+            },
+            {
+                "line": "http://127.0.0.1:8000/oscarapi/baskets/100/lines/2/",
+                "quantity": 0
+            }
+        ]
+
+    Either all lines are changed or, when a quantity is not allowed, none of
+    them and 406 is returned with the ``reason`` and the ``index`` of that
+    line, or only the ``reason`` when the basket would hold more than
+    ``OSCAR_MAX_BASKET_QUANTITY_THRESHOLD`` items. Responds with the lines of
+    the basket.
     """
 
     permission_classes = (permissions.RequestAllowsAccessTo,)
     serializer_class = BasketLineSerializer
+    line_quantity_serializer_class = LineQuantitySerializer
     queryset = Line.objects.all()
+    expandable_fields = ("product",)
 
     def get_queryset(self):
         basket_pk = self.kwargs.get("pk")
         basket = self.check_basket_permission(self.request, basket_pk=basket_pk)
-        prepped_basket = operations.assign_basket_strategy(basket, self.request)
+        prepped_basket = operations.get_prepared_basket(basket, self.request)
         return prepped_basket.all_lines()
 
+    def perform_create(self, serializer):
+        super(LineList, self).perform_create(serializer)
+        operations.invalidate_prepared_basket(serializer.instance.basket, self.request)
+
     # pylint: disable=W1113
     def post(
         self, request, pk, format=None, *args, **kwargs
@@ -308,16 +500,107 @@ class LineList(BasketPermissionMixin, generics.ListCreateAPIView):
             )
         return super(LineList, self).post(request, format=format)
 
+    def patch(
+        self, request, pk, format=None, *args, **kwargs
+    ):  # pylint: disable=redefined-builtin,unused-argument
+        basket = self.check_basket_permission(request, basket_pk=pk)
+        if not basket.can_be_edited:
+            raise exceptions.PermissionDenied(
+                _("You cannot modify a %s basket") % basket.status.lower()
+            )
+
+        q_ser = self.line_quantity_serializer_class(
+            data=request.data, many=True, context={"request": request}
+        )
+        if not q_ser.is_valid():
+            return Response(
+                {"reason": q_ser.errors}, status=status.HTTP_406_NOT_ACCEPTABLE
+            )
+
+        lines = basket.lines.select_related("product", "stockrecord").in_bulk(
+            [item["line"] for item in q_ser.validated_data]
+        )
+        quantities = {pk: line.quantity for pk, line in lines.items()}
+        # only the strategy is needed to check the quantities
+        basket.strategy = get_strategy(request)
+        for index, item in enumerate(q_ser.validated_data):
+            line = lines.get(item["line"])
+            if line is None:
+                return Response(
+                    {"reason": _("Line not in basket"), "index": index},
+                    status=status.HTTP_406_NOT_ACCEPTABLE,
+                )
+
+            line.basket = basket
+            line.quantity = item["quantity"]
+            allowed, message = self.validate_line(line, quantities[line.pk])
+            if not allowed:
+                return Response(
+                    {"reason": message, "index": index},
+                    status=status.HTTP_406_NOT_ACCEPTABLE,
+                )
+
+        # the threshold applies to the basket after all the changes
+        added = sum(line.quantity - quantities[pk] for pk, line in lines.items())
+        if added > 0:
+            allowed, message = basket.is_quantity_allowed(added)
+            if not allowed:
+                return Response(
+                    {"reason": message}, status=status.HTTP_406_NOT_ACCEPTABLE
+                )
 
-class BasketLineDetail(generics.RetrieveUpdateDestroyAPIView):
+        now = timezone.now()
+        for line in lines.values():
+            line.date_updated = now
+        with transaction.atomic():
+            Line.objects.filter(
+                pk__in=[line.pk for line in lines.values() if not line.quantity]
+            ).delete()
+            Line.objects.bulk_update(
+                [line for line in lines.values() if line.quantity],
+                ["quantity", "date_updated"],
+            )
+            # bulk_update doesn't send the signals of the receivers
+            baskets_changed([basket.pk])
+
+        operations.invalidate_prepared_basket(basket, request)
+        prepped_basket = operations.get_prepared_basket(basket, request)
+        ser = self.get_serializer(prepped_basket.all_lines(), many=True)
+        return Response(ser.data)
+
+    def validate_line(self, line, current_qty):
+        "Check the new quantity of ``line`` like ``AddProductView`` does"
+        if not line.quantity:
+            return True, None
+
+        availability = line.purchase_info.availability
+        if line.quantity > current_qty and not availability.is_available_to_buy:
+            return False, availability.message
+        return availability.is_purchase_permitted(line.quantity)
+
+
+class BasketLineDetail(
+    BasketVersionMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """
     Only the field `quantity` can be changed in this view.
     All other fields are readonly.
+
+    The fields can be chosen with ``?fields=`` and the product can be
+    included instead of as a hyperlink with ``?expand=product``.
     """
 
     queryset = Line.objects.all()
     serializer_class = BasketLineSerializer
     permission_classes = (permissions.RequestAllowsAccessTo,)
+    expandable_fields = ("product",)
+
+    def get_basket_id(self):
+        basket_pk = self.kwargs.get("basket_pk")
+        basket = generics.get_object_or_404(operations.editable_baskets(), pk=basket_pk)
+        if not operations.request_allows_access_to_basket(self.request, basket):
+            raise exceptions.NotFound()
+        return basket.pk
 
     def get_queryset(self):
         basket_pk = self.kwargs.get("basket_pk")
@@ -327,3 +610,11 @@ class BasketLineDetail(generics.RetrieveUpdateDestroyAPIView):
             return prepped_basket.all_lines()
         else:
             return self.queryset.none()
+
+    def perform_update(self, serializer):
+        super(BasketLineDetail, self).perform_update(serializer)
+        operations.invalidate_prepared_basket(serializer.instance.basket, self.request)
+
+    def perform_destroy(self, instance):
+        super(BasketLineDetail, self).perform_destroy(instance)
+        operations.invalidate_prepared_basket(instance.basket, self.request)
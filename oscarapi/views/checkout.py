@@ -7,7 +7,12 @@ from oscarapi.basket.operations import request_allows_access_to_basket
 from oscarapi.permissions import IsOwner
 from oscarapi.utils.loading import get_api_classes
 from oscarapi.signals import oscarapi_post_checkout
-from oscarapi.views.utils import parse_basket_from_hyperlink
+from oscarapi.views.utils import (
+    KeysetPaginationMixin,
+    PrefetchSerializerMixin,
+    SparseFieldsetMixin,
+    parse_basket_from_hyperlink,
+)
 
 Order = get_model("order", "Order")
 OrderLine = get_model("order", "Line")
@@ -42,24 +47,44 @@ __all__ = (
 )
 
 
-class OrderList(generics.ListAPIView):
+class OrderList(
+    KeysetPaginationMixin,
+    PrefetchSerializerMixin,
+    SparseFieldsetMixin,
+    generics.ListAPIView,
+):
+    """
+    List the orders of the current user.
+
+    The fields can be chosen and the lines can be included instead of as a
+    hyperlink, eg::
+
+        http://127.0.0.1:8000/api/orders/?fields=url,number,lines&expand=lines
+    """
+
     serializer_class = OrderSerializer
     permission_classes = (IsOwner,)
+    keyset_orderings = ("-date_placed", "date_placed")
+    expandable_fields = ("lines", "lines.product")
 
     def get_queryset(self):
         qs = Order.objects.all()
         return qs.filter(user=self.request.user)
 
 
-class OrderDetail(generics.RetrieveAPIView):
+class OrderDetail(
+    PrefetchSerializerMixin, SparseFieldsetMixin, generics.RetrieveAPIView
+):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (IsOwner,)
+    expandable_fields = ("lines", "lines.product")
 
 
-class OrderLineList(generics.ListAPIView):
+class OrderLineList(PrefetchSerializerMixin, SparseFieldsetMixin, generics.ListAPIView):
     queryset = OrderLine.objects.all()
     serializer_class = OrderLineSerializer
+    expandable_fields = ("product",)
 
     def get_queryset(self):
         pk = self.kwargs.get("pk")
@@ -67,9 +92,12 @@ class OrderLineList(generics.ListAPIView):
         return super().get_queryset().filter(order_id=pk, order__user=user)
 
 
-class OrderLineDetail(generics.RetrieveAPIView):
+class OrderLineDetail(
+    PrefetchSerializerMixin, SparseFieldsetMixin, generics.RetrieveAPIView
+):
     queryset = OrderLine.objects.all()
     serializer_class = OrderLineSerializer
+    expandable_fields = ("product",)
 
     def get_queryset(self):
         return super().get_queryset().filter(order__user=self.request.user)
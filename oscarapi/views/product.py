@@ -1,11 +1,38 @@
 # pylint: disable=unbalanced-tuple-unpacking
-from rest_framework import generics
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from itertools import islice
+
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext as _
+
+from rest_framework import exceptions, generics
+from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from oscar.core.loading import get_class, get_model
 
+from oscarapi import settings
+from oscarapi.models import ProductTombstone
+from oscarapi.renderers import CSVRenderer, NDJSONRenderer
+from oscarapi.utils.cache import get_model_versions, get_representation_version
 from oscarapi.utils.categories import find_from_full_slug
 from oscarapi.utils.loading import get_api_classes, get_api_class
+from oscarapi.utils.strategy import fetch_purchase_info, get_strategy
+from oscarapi.views.utils import (
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
+    PrefetchSerializerMixin,
+    SparseFieldsetMixin,
+    get_query_param_list,
+)
 
 Selector = get_class("partner.strategy", "Selector")
 (
@@ -14,6 +41,8 @@ Selector = get_class("partner.strategy", "Selector")
     ProductSerializer,
     ProductStockRecordSerializer,
     AvailabilitySerializer,
+    ProductPurchaseInfoSerializer,
+    ProductTombstoneSerializer,
 ) = get_api_classes(
     "serializers.product",
     [
@@ -22,22 +51,100 @@ Selector = get_class("partner.strategy", "Selector")
         "ProductSerializer",
         "ProductStockRecordSerializer",
         "AvailabilitySerializer",
+        "ProductPurchaseInfoSerializer",
+        "ProductTombstoneSerializer",
     ],
 )
 
 PriceSerializer = get_api_class("serializers.checkout", "PriceSerializer")
 
 
-__all__ = ("ProductList", "ProductDetail", "ProductPrice", "ProductAvailability")
+__all__ = (
+    "ProductList",
+    "ProductChangeList",
+    "ProductExport",
+    "ProductDetail",
+    "ProductPrice",
+    "ProductAvailability",
+    "ProductPurchaseInfoList",
+)
 
 Product = get_model("catalogue", "Product")
 Category = get_model("catalogue", "Category")
+ProductClass = get_model("catalogue", "ProductClass")
+ProductAttribute = get_model("catalogue", "ProductAttribute")
+Option = get_model("catalogue", "Option")
+AttributeOption = get_model("catalogue", "AttributeOption")
 StockRecord = get_model("partner", "StockRecord")
 
 
-class ProductList(generics.ListAPIView):
+class ProductList(
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
+    PrefetchSerializerMixin,
+    SparseFieldsetMixin,
+    generics.ListAPIView,
+):
+    """
+    List all products.
+
+    The fields of the products can be chosen and the price, availability and
+    stockrecords of every product can be included in the listing instead of
+    as a hyperlink, eg::
+
+        http://127.0.0.1:8000/api/products/?fields=url,title,price&expand=price
+
+    The purchase info for all the products in the listing is then fetched
+    in one go.
+
+    Pass a ``cursor`` to page through the products with keyset pagination,
+    eg::
+
+        http://127.0.0.1:8000/api/products/?cursor=&ordering=-date_updated
+
+    The listing has an ``ETag``, computed from the versions of the products
+    and of the categories, classes, attributes and options they render,
+    without querying the database, unless price or availability is expanded.
+    It needs ``OSCARAPI_TRACK_PRODUCT_CHANGES`` and the
+    ``OSCARAPI_CATALOGUE_VERSION_CACHE``.
+    """
+
     queryset = Product.objects.all()
     serializer_class = ProductLinkSerializer
+    keyset_orderings = ("id", "-id", "date_updated", "-date_updated")
+    expandable_fields = ("price", "availability", "stockrecords")
+    # these depend on the strategy
+    purchase_info_fields = ("price", "availability")
+    # the products render parts of these, which have no modification date
+    catalogue_models = (
+        Category,
+        ProductClass,
+        ProductAttribute,
+        Option,
+        AttributeOption,
+    )
+
+    def get_version(self):
+        # without tracking, changes to stockrecords and attribute values
+        # don't give the products a new version
+        if (
+            self.get_expand().intersection(self.purchase_info_fields)
+            or not settings.TRACK_PRODUCT_CHANGES
+        ):
+            return None
+        return get_model_versions(Product, *self.catalogue_models)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(ProductList, self).get_serializer(*args, **kwargs)
+        child = getattr(serializer, "child", serializer)
+        expanded = self.get_expand().intersection(self.purchase_info_fields)
+        if expanded.intersection(child.fields) and serializer.instance is not None:
+            products = list(serializer.instance)
+            serializer.instance = products
+            serializer.context["purchase_info"] = fetch_purchase_info(
+                get_strategy(self.request), products
+            )
+        return serializer
 
     def get_queryset(self):
         """
@@ -58,9 +165,277 @@ class ProductList(generics.ListAPIView):
         return qs
 
 
-class ProductDetail(generics.RetrieveAPIView):
+class ProductChangeFeedPagination(BasePagination):  # pylint: disable=abstract-method
+    """
+    Pages through the changed and the deleted products in the order in which
+    the changes happened.
+
+    The cursor records how far the client got in both the products, ordered
+    by ``date_updated``, and the tombstones of the deleted products, so a
+    sync can be resumed later on with the cursor of the last response.
+    Changes younger than ``delay`` seconds are left out, so changes that are
+    committed late are not skipped, see ``OSCARAPI_CHANGE_FEED_DELAY``.
+    """
+
+    delay = settings.CHANGE_FEED_DELAY
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "since"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size > 0:
+            return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def encode_cursor(self, positions):
+        positions = [
+            None if position is None else [position[0].isoformat(), position[1]]
+            for position in positions
+        ]
+        return urlsafe_b64encode(json.dumps(positions).encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None
+
+        try:
+            product_position, tombstone_position = json.loads(
+                urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            return (
+                self.decode_position(product_position),
+                self.decode_position(tombstone_position),
+            )
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise exceptions.ValidationError(
+                {self.cursor_query_param: _("Invalid cursor")}
+            )
+
+    def decode_position(self, position):
+        if position is None:
+            return None
+
+        timestamp, pk = position
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError("Invalid timestamp")
+        return timestamp, int(pk)
+
+    def seek(self, queryset, field, position):
+        queryset = queryset.order_by(field, "id")
+        if position is None:
+            return queryset
+
+        timestamp, pk = position
+        return queryset.filter(
+            Q(**{"%s__gt" % field: timestamp}) | Q(**{field: timestamp, "id__gt": pk})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # pylint: disable=attribute-defined-outside-init
+        self.request = request
+        page_size = self.get_page_size(request)
+        product_position, tombstone_position = self.decode_cursor(request)
+
+        products = self.seek(queryset, "date_updated", product_position)
+        tombstones = self.seek(
+            ProductTombstone.objects.all(), "date_deleted", tombstone_position
+        )
+        if self.delay:
+            until = timezone.now() - timedelta(seconds=self.delay)
+            products = products.filter(date_updated__lte=until)
+            tombstones = tombstones.filter(date_deleted__lte=until)
+        changes = [
+            (product.date_updated, 0, product.pk, product)
+            for product in products[: page_size + 1]
+        ] + [
+            (tombstone.date_deleted, 1, tombstone.pk, tombstone)
+            for tombstone in tombstones[: page_size + 1]
+        ]
+        self.has_more = len(changes) > page_size
+        changes = sorted(changes, key=lambda change: change[:3])[:page_size]
+
+        page = [change for _, kind, _, change in changes if kind == 0]
+        self.tombstones = [change for _, kind, _, change in changes if kind == 1]
+        if page:
+            product_position = (page[-1].date_updated, page[-1].pk)
+        if self.tombstones:
+            tombstone_position = (
+                self.tombstones[-1].date_deleted,
+                self.tombstones[-1].pk,
+            )
+        self.cursor = self.encode_cursor((product_position, tombstone_position))
+
+        return page
+
+    def get_next_link(self):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("cursor", self.cursor),
+                    ("has_more", self.has_more),
+                    ("results", data),
+                    (
+                        "deleted",
+                        ProductTombstoneSerializer(self.tombstones, many=True).data,
+                    ),
+                ]
+            )
+        )
+
+
+class ProductChangeList(ProductList):
+    """
+    List the products that changed and the ones that were deleted since the
+    last sync, eg::
+
+        http://127.0.0.1:8000/api/products/changes/?since=<cursor>
+
+    Leave out ``since`` to start at the beginning. Every response contains
+    the ``cursor`` to continue from, also when nothing changed, so it can be
+    stored for the next sync. Keep following ``next`` while ``has_more`` is
+    true.
+
+    Changes to the stockrecords, attribute values and images of a product
+    are included as well, see ``OSCARAPI_TRACK_PRODUCT_CHANGES``. Changes are
+    reported after ``OSCARAPI_CHANGE_FEED_DELAY`` seconds, and a client that
+    did not sync for ``OSCARAPI_PRODUCT_TOMBSTONE_RETENTION_DAYS`` should
+    start over, as it can miss deletions.
+    """
+
+    pagination_class = ProductChangeFeedPagination
+    keyset_pagination_class = None
+
+
+class ProductExport(ProductList):
+    """
+    Export all products at once, as newline delimited json or as csv, eg::
+
+        http://127.0.0.1:8000/api/products/export/?format=csv&fields=id,upc,title
+
+    The response is streamed while the products are fetched and serialized
+    in chunks of ``OSCARAPI_EXPORT_CHUNK_SIZE``, so the memory use does not
+    grow with the size of the catalogue. The fields can be chosen and
+    expanded as in the product list.
+    """
+
+    serializer_class = ProductSerializer
+    renderer_classes = (NDJSONRenderer, CSVRenderer)
+    pagination_class = None
+    keyset_pagination_class = None
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+
+    def get_version(self):
+        # the export is not revalidated, so don't aggregate the products
+        return None
+
+    def get_chunks(self, queryset):
+        products = queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(products, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def get_rows(self, queryset):
+        for chunk in self.get_chunks(queryset):
+            # the related objects are prefetched for every chunk
+            yield from self.get_serializer(chunk, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).order_by("pk")
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_rows(self.get_rows(queryset)),
+            content_type="%s; charset=%s" % (renderer.media_type, renderer.charset),
+        )
+        response["Content-Disposition"] = (
+            'attachment; filename="products.%s"' % renderer.format
+        )
+        return response
+
+
+class ProductDetail(
+    ConditionalGetMixin,
+    PrefetchSerializerMixin,
+    SparseFieldsetMixin,
+    generics.RetrieveAPIView,
+):
+    """
+    Retrieve a product.
+
+    The fields can be chosen and price, availability and stockrecords can be
+    included instead of as a hyperlink, eg::
+
+        http://127.0.0.1:8000/api/products/1/?fields=url,title,price&expand=price
+
+    The ``ETag`` and ``Last-Modified`` validators are computed from the
+    modification dates of the product and its children, and from the
+    version of its cached representation, or, when products are not cached,
+    the versions of the categories, classes, attributes and options they
+    render. Without either the product has no validators.
+    """
+
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    expandable_fields = ProductList.expandable_fields
+    purchase_info_fields = ProductList.purchase_info_fields
+    catalogue_models = ProductList.catalogue_models
+
+    def get_versions(self, pk):
+        versions = get_representation_version(Product, pk)
+        if versions is None and settings.TRACK_PRODUCT_CHANGES:
+            # the modification date covers the stockrecords, attribute values
+            # and images only when the changes are tracked
+            versions = get_model_versions(*self.catalogue_models)
+        return versions
+
+    def get_validators(self):
+        if not hasattr(self, "_validators"):
+            pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            # pylint: disable=attribute-defined-outside-init
+            self._validators = (
+                self.get_queryset()
+                .filter(Q(pk=pk) | Q(parent_id=pk))
+                .aggregate(last_modified=Max("date_updated"), count=Count("pk"))
+            )
+            self._validators["versions"] = self.get_versions(pk)
+        return self._validators
+
+    def get_last_modified(self):
+        if self.get_version() is None:
+            return None
+
+        # the versions are the time they were made
+        validators = self.get_validators()
+        changed = datetime.fromtimestamp(
+            max(validators["versions"]) / 10**9, tz=dt_timezone.utc
+        )
+        if timezone.is_naive(validators["last_modified"]):
+            changed = timezone.make_naive(changed)
+        return max(validators["last_modified"], changed)
+
+    def get_version(self):
+        validators = self.get_validators()
+        if (
+            validators["last_modified"] is None
+            or validators["versions"] is None
+            or self.get_expand().intersection(self.purchase_info_fields)
+        ):
+            return None
+        return "%(last_modified)s:%(count)s:%(versions)s" % validators
 
 
 class ProductPrice(generics.RetrieveAPIView):
@@ -78,6 +453,49 @@ class ProductPrice(generics.RetrieveAPIView):
         return Response(ser.data)
 
 
+class ProductPurchaseInfoList(generics.ListAPIView):
+    """
+    Retrieve the price and availability of many products at once.
+
+    GET:
+    The products can be selected by id and by upc, eg::
+
+        http://127.0.0.1:8000/api/products/purchase-info/?ids=1,2,3&upcs=1234
+
+    The stockrecords of all the products are fetched in one go and one
+    strategy is used for all of them. Unknown products are left out.
+    """
+
+    queryset = Product.objects.all()
+    serializer_class = ProductPurchaseInfoSerializer
+    max_products = settings.PURCHASE_INFO_MAX_PRODUCTS
+
+    def get_queryset(self):
+        ids = get_query_param_list(self.request, "ids")
+        upcs = get_query_param_list(self.request, "upcs")
+
+        if len(ids) + len(upcs) > self.max_products:
+            raise exceptions.ValidationError(
+                _("No more than %(max_products)s products can be requested at once")
+                % {"max_products": self.max_products}
+            )
+        try:
+            ids = [int(pk) for pk in ids]
+        except ValueError:
+            raise exceptions.ValidationError({"ids": _("Ids should be integers")})
+
+        qs = super(ProductPurchaseInfoList, self).get_queryset()
+        return qs.filter(Q(pk__in=ids) | Q(upc__in=upcs))
+
+    def list(self, request, *args, **kwargs):
+        products = list(self.get_queryset())
+        ser = self.get_serializer(products, many=True)
+        ser.context["purchase_info"] = fetch_purchase_info(
+            get_strategy(request), products
+        )
+        return Response(ser.data)
+
+
 class ProductStockRecords(generics.ListAPIView):
     serializer_class = ProductStockRecordSerializer
     queryset = StockRecord.objects.all()
@@ -108,10 +526,14 @@ class ProductAvailability(generics.RetrieveAPIView):
         return Response(ser.data)
 
 
-class CategoryList(generics.ListAPIView):
+class CategoryList(ConditionalGetMixin, generics.ListAPIView):
     queryset = Category.get_root_nodes()
     serializer_class = CategorySerializer
 
+    def get_version(self):
+        # the breadcrumbs depend on the ancestors, so use all the categories
+        return get_model_versions(Category)
+
     def get_queryset(self):
         breadcrumb_path = self.kwargs.get("breadcrumbs", None)
         if breadcrumb_path is None:
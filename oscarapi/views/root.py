@@ -14,7 +14,12 @@ def PUBLIC_APIS(r, f):
         ("register", reverse("api-register", request=r, format=f)),
         ("login", reverse("api-login", request=r, format=f)),
         ("basket", reverse("api-basket", request=r, format=f)),
+        ("basket-summary", reverse("api-basket-summary", request=r, format=f)),
         ("basket-add-product", reverse("api-basket-add-product", request=r, format=f)),
+        (
+            "basket-add-products",
+            reverse("api-basket-add-products", request=r, format=f),
+        ),
         ("basket-add-voucher", reverse("api-basket-add-voucher", request=r, format=f)),
         (
             "basket-shipping-methods",
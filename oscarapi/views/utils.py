@@ -1,14 +1,36 @@
+import hashlib
+from calendar import timegm
+
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 from oscar.core.loading import get_model
 from oscarapi import permissions
+from oscarapi.basket.versioning import (
+    claim_basket_version,
+    get_basket_version,
+    get_basket_version_cache,
+)
+from oscarapi.utils.prefetch import prefetch_for_serializer
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+from django.utils.translation import gettext as _, gettext_lazy
 
-from rest_framework import exceptions, generics
+from rest_framework import exceptions, generics, status
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.utils.urls import replace_query_param
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.relations import HyperlinkedRelatedField
 
-__all__ = ("BasketPermissionMixin",)
+__all__ = (
+    "BasketPermissionMixin",
+    "PrefetchSerializerMixin",
+    "ConditionalGetMixin",
+    "BasketVersionMixin",
+    "SparseFieldsetMixin",
+    "KeysetPaginationMixin",
+)
 
 Basket = get_model("basket", "Basket")
 
@@ -23,6 +45,16 @@ class QuerySetList(list):
         return self.queryset.model
 
 
+def get_query_param_list(request, name):
+    "Parse a query parameter that takes a comma separated list, or is repeated"
+    return [
+        value.strip()
+        for param in request.query_params.getlist(name)
+        for value in param.split(",")
+        if value.strip()
+    ]
+
+
 def parse_basket_from_hyperlink(DATA, format):  # pylint: disable=redefined-builtin
     "Parse basket from relation hyperlink"
     basket_parser = HyperlinkedRelatedField(
@@ -57,6 +89,223 @@ class BasketPermissionMixin(object):
         return basket
 
 
+class PrefetchSerializerMixin(object):
+    """
+    This mixin makes sure all the related objects the serializer is going to
+    render are fetched in a fixed number of queries, instead of a couple of
+    queries for every object, see :mod:`oscarapi.utils.prefetch`.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(PrefetchSerializerMixin, self).get_serializer(
+            *args, **kwargs
+        )
+        if serializer.instance is not None:
+            serializer.instance = prefetch_for_serializer(
+                serializer.instance, serializer
+            )
+        return serializer
+
+
+class SparseFieldsetMixin(object):
+    """
+    This mixin lets clients choose the fields that are rendered, eg::
+
+        http://127.0.0.1:8000/api/products/?fields=url,title,price
+
+    and which of the ``expandable_fields`` are rendered inline instead of as
+    a hyperlink, eg::
+
+        http://127.0.0.1:8000/api/products/?expand=price,stockrecords
+
+    Fields that are left out are not rendered at all. When the view uses
+    :class:`PrefetchSerializerMixin` as well, it should come first, so the
+    related objects of the fields that are left out are not fetched either.
+    """
+
+    expandable_fields = ()
+
+    def get_query_param_list(self, name):
+        return get_query_param_list(self.request, name)
+
+    def get_expand(self):
+        return {
+            name
+            for name in self.get_query_param_list("expand")
+            if name in self.expandable_fields
+        }
+
+    def get_requested_fields(self):
+        if self.request.method not in SAFE_METHODS:
+            return None
+        return self.get_query_param_list("fields") or None
+
+    def get_serializer_context(self):
+        context = super(SparseFieldsetMixin, self).get_serializer_context()
+        if self.request is not None:
+            context["expand"] = self.get_expand()
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(SparseFieldsetMixin, self).get_serializer(*args, **kwargs)
+        requested_fields = self.get_requested_fields()
+        if requested_fields:
+            child = getattr(serializer, "child", serializer)
+            for field_name in set(child.fields) - set(requested_fields):
+                child.fields.pop(field_name)
+        return serializer
+
+
+class ConditionalGetMixin(object):
+    """
+    This mixin answers conditional GET requests with ``304 Not Modified``
+    when the validators of the view did not change, before anything is
+    serialized.
+
+    Views implement ``get_version``, which should return a value that is
+    cheap to compute and changes whenever the response does, and can
+    implement ``get_last_modified`` as well.
+    """
+
+    def get_version(self):
+        return None
+
+    def get_last_modified(self):
+        return None
+
+    def get_etag_url(self):
+        return self.request.build_absolute_uri()
+
+    def get_etag(self):
+        version = self.get_version()  # pylint: disable=assignment-from-none
+        if version is None:
+            return None
+
+        # the response also depends on the url (hyperlinks, query parameters)
+        # and the renderer
+        key = "%s|%s|%s" % (
+            version,
+            self.get_etag_url(),
+            self.request.accepted_media_type,
+        )
+        return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        last_modified = self.get_last_modified()  # pylint: disable=E1128
+        if last_modified is not None:
+            last_modified = timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class PreconditionFailed(exceptions.APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = gettext_lazy("The basket was changed by another request.")
+    default_code = "precondition_failed"
+
+
+class BasketVersionMixin(BasketPermissionMixin, ConditionalGetMixin):
+    """
+    This mixin uses the version of a basket, see
+    :mod:`oscarapi.basket.versioning`, for the ETag of the view. Besides
+    conditional GET requests, changes with an ``If-Match`` header are only
+    made when nobody changed the basket in the meantime, without locking it,
+    and are answered with ``412 Precondition Failed`` otherwise.
+
+    Such changes are made in a transaction and the version is claimed once
+    they succeeded, so a change that fails leaves the version alone, and a
+    change that loses the race is rolled back.
+
+    The basket is taken from the ``basket_lookup_url_kwarg`` of the url, views
+    that find it differently override ``get_basket_id``, which should check
+    the permissions on the basket as well.
+    """
+
+    basket_lookup_url_kwarg = "pk"
+
+    def get_basket_id(self):
+        basket_pk = self.kwargs.get(self.basket_lookup_url_kwarg)
+        return self.check_basket_permission(self.request, basket_pk=basket_pk).pk
+
+    def get_basket_version(self):
+        if not hasattr(self, "_basket_version"):
+            self._basket_version = get_basket_version(  # pylint: disable=W0201
+                self.get_basket_id()
+            )
+        return self._basket_version
+
+    def get_version(self):
+        version = self.get_basket_version()
+        if version is None:
+            return None
+        return "basket:%s:%s" % version
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super(BasketVersionMixin, self).dispatch(request, *args, **kwargs)
+
+        if "HTTP_IF_MATCH" in request.META and get_basket_version_cache() is not None:
+            with transaction.atomic():
+                response = super(BasketVersionMixin, self).dispatch(
+                    request, *args, **kwargs
+                )
+        else:
+            response = super(BasketVersionMixin, self).dispatch(
+                request, *args, **kwargs
+            )
+
+        # the new version is only known once the changes are committed
+        if (
+            request.method != "DELETE"
+            and status.is_success(response.status_code)
+            and not transaction.get_connection().in_atomic_block
+        ):
+            if hasattr(self, "_basket_version"):
+                del self._basket_version
+            etag = self.get_etag()
+            if etag is not None:
+                response["ETag"] = etag
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super(BasketVersionMixin, self).initial(request, *args, **kwargs)
+        if_match = request.META.get("HTTP_IF_MATCH")
+        if request.method in SAFE_METHODS or if_match is None:
+            return
+
+        etag = self.get_etag()
+        if etag is None:
+            return
+        etags = parse_etags(if_match)
+        if "*" not in etags and etag not in etags:
+            raise PreconditionFailed()
+        # pylint: disable=attribute-defined-outside-init
+        self._claim = (self.get_basket_id(), self.get_basket_version()[0])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        claim = getattr(self, "_claim", None)
+        if claim is not None and status.is_success(response.status_code):
+            # the version only matches for the first of concurrent requests
+            if not claim_basket_version(*claim):
+                transaction.set_rollback(True)
+                response = self.handle_exception(PreconditionFailed())
+        return super(BasketVersionMixin, self).finalize_response(
+            request, response, *args, **kwargs
+        )
+
+
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = "page_size"
@@ -78,3 +327,78 @@ class CustomPageNumberPagination(PageNumberPagination):
         url = self.request.build_absolute_uri()
         page_number = self.page.previous_page_number()
         return replace_query_param(url, self.page_query_param, page_number)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks from the last seen position instead of
+    using an offset, so every page costs the same, no matter how deep.
+
+    The ordering can be chosen with ``?ordering=`` from the
+    ``keyset_orderings`` of the view and the (slow) total count is only
+    included when asked for with ``?count=true``.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering = "id"
+    ordering_query_param = "ordering"
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        orderings = getattr(view, "keyset_orderings", (self.ordering,))
+        ordering = request.query_params.get(self.ordering_query_param, orderings[0])
+        if ordering not in orderings:
+            raise exceptions.ValidationError(
+                {
+                    self.ordering_query_param: _(
+                        "Ordering should be one of %(orderings)s"
+                    )
+                    % {"orderings": ", ".join(orderings)}
+                }
+            )
+        # add the primary key to make the ordering stable
+        if ordering.lstrip("-") in ("id", "pk"):
+            return (ordering,)
+        return (ordering, "-id" if ordering.startswith("-") else "id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # pylint: disable=attribute-defined-outside-init
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ("true", "1"):
+            self.count = queryset.count()
+        return super(KeysetPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super(KeysetPagination, self).get_paginated_response(data)
+        if self.count is not None:
+            response.data["count"] = self.count
+        return response
+
+
+class KeysetPaginationMixin(object):
+    """
+    This mixin switches a list view to :class:`KeysetPagination` when the
+    client passes a ``cursor`` (an empty one for the first page), eg::
+
+        http://127.0.0.1:8000/api/products/?cursor=&ordering=-date_updated
+
+    Without a cursor the view paginates as configured before.
+    """
+
+    keyset_pagination_class = KeysetPagination
+    keyset_orderings = ("id",)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            pagination_class = self.keyset_pagination_class
+            if (
+                pagination_class is not None
+                and pagination_class.cursor_query_param in self.request.query_params
+            ):
+                self._paginator = (  # pylint: disable=attribute-defined-outside-init
+                    pagination_class()
+                )
+        return super(KeysetPaginationMixin, self).paginator